@@ -10,28 +10,1892 @@ import socketserver
 import json
 import sqlite3
 import hashlib
+import hmac
 import jwt
 import re
+import select
 import os
 import urllib.request
 import urllib.parse
 import base64
 import mimetypes
+import multiprocessing
+import argparse
+import bisect
+import logging
+import logging.handlers
+import queue
+import signal
+import socket
+import tempfile
+import threading
+import contextlib
+import glob
+import itertools
+import zlib
+import gzip
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime, timedelta, timezone
+from email.utils import formatdate
+
+try:
+    import brotli  # opcional: pre-compressao brotli dos arquivos estaticos
+except ImportError:
+    brotli = None
 
 PORT = 8000
 SECRET_KEY = "projeto_fullstack_2024_secret_key"
 DB_NAME = "sistema_gestao.db"
 
-# Rate limiting simples (IP: timestamp)
-login_attempts = {}
+# Modo de concorrencia: 'threaded' (pool de threads) ou 'single' (uma requisicao por vez)
+SERVER_MODE = os.environ.get('SERVER_MODE', 'threaded')
+SERVER_WORKERS = int(os.environ.get('SERVER_WORKERS', 16))
+SERVER_QUEUE_SIZE = int(os.environ.get('SERVER_QUEUE_SIZE', 64))
+# Modo prefork: processos filhos, cada um com seu pool de threads
+SERVER_PROCESSES = int(os.environ.get('SERVER_PROCESSES', os.cpu_count() or 1))
+DRAIN_TIMEOUT = 30  # segundos para terminar requisicoes em andamento no SIGTERM
+WORKER_STOP_POLL = 0.5  # segundos entre verificacoes de parada de um worker ocioso
+WORKER_RESTART_DELAY = 1  # espera antes de recriar um processo que caiu
+# HTTP/1.1 keep-alive: conexao ociosa ocupa um worker, entao o timeout e curto
+KEEPALIVE_TIMEOUT = float(os.environ.get('KEEPALIVE_TIMEOUT', 5))
+KEEPALIVE_MAX_REQUESTS = int(os.environ.get('KEEPALIVE_MAX_REQUESTS', 100))
+KEEPALIVE_DRAIN_LIMIT = 64 * 1024  # corpo nao lido ate esse tamanho e descartado; acima fecha a conexao
+
+# Controle de carga: acima do limite a resposta e 503 + Retry-After na hora
+# Requisicoes sendo processadas ao mesmo tempo (0 = numero de workers)
+MAX_IN_FLIGHT = int(os.environ.get('MAX_IN_FLIGHT', 0))
+# Conexao que esperou mais que isso na fila por um worker e recusada sem ser lida
+QUEUE_WAIT_LIMIT = float(os.environ.get('QUEUE_WAIT_LIMIT', 2))
+# Prazo de cada requisicao: consultas SQLite e a chamada ao ViaCEP sao interrompidas
+REQUEST_DEADLINE = float(os.environ.get('REQUEST_DEADLINE', 10))
+REQUEST_IO_TIMEOUT = 10  # segundos por leitura/escrita no socket durante a requisicao
+SHED_RETRY_AFTER = 1  # Retry-After das respostas 503
+DEADLINE_CHECK_OPS = 10000  # instrucoes da VM do SQLite entre verificacoes do prazo
+
+# Pool de conexoes SQLite (uma conexao por worker, mantida aberta)
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', SERVER_WORKERS))
+DB_BUSY_TIMEOUT = 5  # segundos esperando o lock de escrita
+DB_MMAP_SIZE = 256 * 1024 * 1024
+DB_CACHED_STATEMENTS = 256
+
+# Projetos particionados por usuario: o usuario fica no shard user_id % SHARD_COUNT.
+# users, cep_cache e login_attempts continuam em DB_NAME (0 = tudo em DB_NAME)
+SHARD_COUNT = int(os.environ.get('SHARD_COUNT', 0))
+SHARD_DIR = os.environ.get('SHARD_DIR', 'shards')
+SHARD_ID_SPAN = 2 ** 40  # faixa de ids de projects reservada para cada shard
+
+# Armazenamento de imagens enderecado por conteudo (sha256 dos bytes decodificados)
+IMAGES_DIR = os.environ.get('IMAGES_DIR', 'uploads')
+IMAGES_URL_PREFIX = '/api/images/'
+MAX_IMAGE_BYTES = 2 * 1024 * 1024
+IMAGE_TYPES = {
+    'image/png': 'png',
+    'image/jpeg': 'jpg',
+    'image/jpg': 'jpg',
+    'image/gif': 'gif',
+    'image/webp': 'webp',
+}
+IMAGE_KEY_RE = re.compile(r'^[0-9a-f]{64}\.(png|jpg|gif|webp)$')
+DATA_URL_RE = re.compile(r'^data:(image/[a-z]+);base64,', re.IGNORECASE)
+# Assinatura (primeiros bytes) de cada formato aceito no upload binario
+IMAGE_SIGNATURES = {
+    'png': (b'\x89PNG\r\n\x1a\n',),
+    'jpg': (b'\xff\xd8\xff',),
+    'gif': (b'GIF87a', b'GIF89a'),
+    'webp': (b'RIFF',),  # + 'WEBP' no offset 8
+}
+IMAGE_CHUNK_SIZE = 64 * 1024  # upload binario e gravado em disco nesse passo
+# Corpos JSON maiores que isso sao recusados antes de serem lidos
+# (data URL de 2MB em base64 ~ 2.7MB + demais campos)
+MAX_JSON_BODY = 3 * 1024 * 1024
+# Rotas que leem o corpo em streaming (com limite proprio)
+STREAMING_BODY_PATHS = ('/api/images', '/api/lists/import')
+
+# Paginacao de GET /api/lists: campos da API -> colunas SQL
+LIST_COLUMNS = {
+    'id': 'id',
+    'texto': 'texto',
+    'description': 'description',
+    'priority': 'priority',
+    'image_path': 'image_key',
+    'pinned': 'pinned',
+    'order_index': 'order_index',
+    'created_at': 'created_at',
+}
+MAX_PAGE_SIZE = 200
+
+# Busca textual (FTS5): resultados por pagina e termos aceitos por consulta
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_TERMS = 10
+# Peso de cada coluna do projects_fts no bm25 (texto, description, user_id)
+SEARCH_WEIGHTS = (10.0, 1.0, 0.0)
+SEARCH_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+# GET /api/stats: meses (mais recentes) na contagem por data de criacao
+STATS_MONTHS = 12
+
+# Exportacao/importacao em NDJSON (um projeto JSON por linha)
+EXPORT_CHUNK_SIZE = 64 * 1024  # bytes acumulados antes de enviar um chunk
+IMPORT_BATCH_SIZE = 500  # linhas por transacao
+IMPORT_MAX_LINE = 3 * 1024 * 1024  # linha com imagem em data URL (~2.7MB) + texto
+IMPORT_MAX_ERRORS = 100  # erros listados na resposta (o total vem em failed)
+
+# Campos aceitos por PATCH /api/lists/{id}
+PATCH_FIELDS = ('texto', 'description', 'priority', 'pinned', 'order_index', 'image_path')
+
+# Ranks fracionarios: mover um item grava so order_index = meio entre os vizinhos.
+# Quando o intervalo fica menor que isso a lista do usuario e renumerada em segundo plano.
+RANK_REBALANCE_GAP = 1e-6
+
+# Arquivos estaticos servidos da memoria (pre-comprimidos, com ETag)
+STATIC_PRELOAD = ('index.html', 'lista.html', 'style.css', 'js/auth.js')
+STATIC_EXTENSIONS = ('.html', '.css', '.js', '.svg', '.json', '.ico', '.png', '.jpg', '.jpeg', '.gif', '.webp')
+STATIC_COMPRESSIBLE = ('.html', '.css', '.js', '.svg', '.json')
+STATIC_MAX_FILE_SIZE = 5 * 1024 * 1024
+STATIC_CACHE_MAX_BYTES = 32 * 1024 * 1024  # total em memoria (todas as versoes); os menos usados saem
+STATIC_CHECK_INTERVAL = 1.0  # segundos entre verificacoes de mtime de um arquivo
+# Saida do scripts/build_assets.py: paginas minificadas e assets com hash no nome.
+# Sem o manifest (build nunca rodado) os arquivos fonte sao servidos direto
+BUILD_DIR = os.environ.get('BUILD_DIR', 'dist')
+BUILD_MANIFEST = 'manifest.json'
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Consulta de CEP: URL do ViaCEP configuravel (testes apontam para um stub local)
+VIACEP_URL = os.environ.get('VIACEP_URL', 'https://viacep.com.br/ws/{cep}/json/')
+CEP_TIMEOUT = 5
+CEP_CACHE_SIZE = 4096  # entradas no LRU em memoria
+CEP_CACHE_TTL = 30 * 24 * 3600  # CEP encontrado
+CEP_NEGATIVE_TTL = 24 * 3600  # CEP inexistente ("erro" do ViaCEP)
+
+# Tokens JWT ja verificados mantidos em memoria (LRU)
+TOKEN_CACHE_SIZE = 10000
+TOKEN_MAX_AGE = 7 * 24 * 3600  # validade dos tokens emitidos no login/registro
+# Revogacoes (logout, troca de senha) - memory: por processo; sqlite:
+# compartilhadas entre processos pelo banco
+TOKEN_REVOCATIONS_BACKEND = os.environ.get('TOKEN_REVOCATIONS', 'memory')
+TOKEN_REVOCATIONS_SYNC = 5  # segundos entre leituras da tabela sem aviso de outro processo
+
+# Stream de alteracoes (SSE) em GET /api/lists/events
+EVENTS_PATH = '/api/lists/events'
+SSE_HEARTBEAT = 15  # segundos sem eventos ate enviar um comentario de keep-alive
+SSE_POLL_INTERVAL = 1.0  # intervalo para notar o drain do servidor
+SSE_RETRY_MS = 3000  # espera do EventSource antes de reconectar
+SSE_HISTORY_SIZE = 1000  # ultimos eventos (todos os usuarios) disponiveis para retomar
+SSE_QUEUE_SIZE = 256  # eventos pendentes por stream antes de derrubar um cliente lento
+# Token em query string (o EventSource nao envia headers) nao vai para o log
+TOKEN_QUERY_RE = re.compile(r'([?&]token=)[^&\s]+')
+
+# Log: DEBUG, INFO, WARNING, ERROR ou OFF (desliga)
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+
+# Metricas no formato do Prometheus
+METRICS_PATH = '/metrics'
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Rotas conhecidas (ids trocados por {id}); o resto vira /api/other ou static
+METRIC_ROUTES = {
+    '/api/register', '/api/login', '/api/logout', '/api/quotes', '/api/stats',
+    '/api/lists', '/api/lists/reorder', '/api/lists/search', '/api/lists/export', '/api/lists/import',
+    '/api/lists/{id}', '/api/lists/{id}/move', EVENTS_PATH,
+    '/api/cep/{cep}', '/api/images', '/api/images/{key}', METRICS_PATH,
+}
+
+# Rate limiting de login por IP (janela deslizante)
 MAX_LOGIN_ATTEMPTS = 5
 LOCKOUT_TIME = 300  # 5 minutos em segundos
+# memory: por processo; sqlite: compartilhado entre processos pelo banco
+LOGIN_LIMITER_BACKEND = os.environ.get('LOGIN_LIMITER', 'memory')
+LOGIN_LIMITER_SIZE = 100000  # IPs lembrados (os menos recentes saem primeiro)
+LOGIN_LIMITER_SHARDS = 16
+
+# Senhas: scrypt com salt (parametros gravados junto do hash)
+PASSWORD_SCRYPT_N = 2 ** 14  # ~16MB de memoria e ~80ms por hash
+PASSWORD_SCRYPT_R = 8
+PASSWORD_SCRYPT_P = 1
+PASSWORD_SALT_BYTES = 16
+# Hashes rodam em processos separados; alem dos que estao rodando, no maximo
+# PASSWORD_QUEUE_SIZE esperam na fila (o resto recebe 503)
+PASSWORD_PROCESSES = int(os.environ.get('PASSWORD_PROCESSES', os.cpu_count() or 1))
+PASSWORD_QUEUE_SIZE = int(os.environ.get('PASSWORD_QUEUE_SIZE', 4))
+PASSWORD_TIMEOUT = 10  # segundos esperando um hash antes de desistir (503)
+PASSWORD_NICE = 10  # prioridade menor: hashing nao rouba CPU das outras rotas
+
+logger = logging.getLogger('basic_server')
+logger.propagate = False
+logger.setLevel(logging.CRITICAL + 1 if LOG_LEVEL == 'OFF' else LOG_LEVEL)
+# Sincrono ate configure_logging() (ex.: scripts que importam o modulo)
+logger.addHandler(logging.StreamHandler())
+log_listener = None
+
+
+def configure_logging(level=LOG_LEVEL):
+    """Log com buffer: a thread da requisicao so enfileira o registro e uma
+    thread separada escreve no stderr. Com `level='OFF'` nada e registrado.
+    
+    Threads nao sobrevivem ao fork: cada processo filho chama de novo.
+    """
+    global log_listener
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    if level == 'OFF':
+        logger.setLevel(logging.CRITICAL + 1)
+        log_listener = None
+        return
+    logger.setLevel(level)
+    
+    stream = logging.StreamHandler()
+    stream.setFormatter(logging.Formatter('[%(levelname)s] %(message)s'))
+    log_queue = queue.SimpleQueue()
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    log_listener = logging.handlers.QueueListener(log_queue, stream)
+    log_listener.start()
+
+
+def flush_logging():
+    """Escreve o que ainda estiver na fila (antes de o processo sair)"""
+    if log_listener is not None:
+        log_listener.stop()
+
+
+class Histogram:
+    """Histograma de buckets fixos (contagens nao acumuladas, soma e total)"""
+    
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+    
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class Metrics:
+    """Contadores e histogramas do processo, exportados em /metrics
+    
+    Cada requisicao atualiza tudo com uma unica aquisicao do lock, no fim do
+    atendimento. No modo prefork cada processo tem os seus numeros.
+    """
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.requests = {}  # (method, route, status) -> total
+        self.latency = {}  # (method, route) -> Histogram
+        self.sql = {}  # (method, route) -> Histogram do tempo em SQLite por requisicao
+        self.bytes_in = {}  # (method, route) -> bytes do corpo recebido
+        self.bytes_out = {}  # (method, route) -> bytes enviados (headers + corpo)
+        self.upstream = {}  # (servico, resultado) -> Histogram
+        self.shed = {}  # (motivo,) -> requisicoes recusadas por sobrecarga
+    
+    def observe_request(self, method, route, status, seconds, sql_seconds, bytes_in, bytes_out):
+        key = (method, route)
+        with self.lock:
+            status_key = (method, route, status)
+            self.requests[status_key] = self.requests.get(status_key, 0) + 1
+            if key not in self.latency:
+                self.latency[key] = Histogram()
+                self.sql[key] = Histogram()
+            self.latency[key].observe(seconds)
+            self.sql[key].observe(sql_seconds)
+            self.bytes_in[key] = self.bytes_in.get(key, 0) + bytes_in
+            self.bytes_out[key] = self.bytes_out.get(key, 0) + bytes_out
+    
+    def observe_upstream(self, service, outcome, seconds):
+        with self.lock:
+            self.upstream.setdefault((service, outcome), Histogram()).observe(seconds)
+    
+    def observe_shed(self, reason):
+        with self.lock:
+            self.shed[(reason,)] = self.shed.get((reason,), 0) + 1
+    
+    def render(self):
+        """Texto no formato de exposicao do Prometheus (versao 0.0.4)"""
+        lines = []
+        
+        def labels(names, values, extra=''):
+            pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+            if extra:
+                pairs.append(extra)
+            return '{' + ','.join(pairs) + '}'
+        
+        def counter(name, help_text, names, values):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} counter')
+            for key, value in sorted(values.items()):
+                lines.append(f'{name}{labels(names, key)} {value}')
+        
+        def histogram(name, help_text, names, values):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} histogram')
+            for key, hist in sorted(values.items()):
+                total = 0
+                for bound, count in zip(hist.buckets + ('+Inf',), hist.counts):
+                    total += count
+                    le = 'le="%s"' % bound
+                    lines.append(f'{name}_bucket{labels(names, key, le)} {total}')
+                lines.append(f'{name}_sum{labels(names, key)} {hist.sum:.6f}')
+                lines.append(f'{name}_count{labels(names, key)} {total}')
+        
+        with self.lock:
+            request_labels = ('method', 'route')
+            counter('http_requests_total', 'Requisicoes HTTP atendidas',
+                    ('method', 'route', 'status'), self.requests)
+            histogram('http_request_duration_seconds', 'Tempo de atendimento da requisicao',
+                      request_labels, self.latency)
+            histogram('http_request_sqlite_seconds', 'Tempo gasto no SQLite por requisicao',
+                      request_labels, self.sql)
+            counter('http_request_bytes_total', 'Bytes recebidos no corpo das requisicoes',
+                    request_labels, self.bytes_in)
+            counter('http_response_bytes_total', 'Bytes enviados nas respostas',
+                    request_labels, self.bytes_out)
+            histogram('upstream_request_duration_seconds', 'Tempo das chamadas a servicos externos',
+                      ('service', 'outcome'), self.upstream)
+            counter('http_requests_shed_total', 'Requisicoes recusadas com 503 por sobrecarga',
+                    ('reason',), self.shed)
+        lines.append('# HELP process_start_time_seconds Inicio do processo (unix)')
+        lines.append('# TYPE process_start_time_seconds gauge')
+        lines.append(f'process_start_time_seconds {self.started:.3f}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+# Tempo em SQLite acumulado pela requisicao atendida na thread
+sql_timer = threading.local()
+
+
+def add_sql_time(start):
+    sql_timer.seconds = getattr(sql_timer, 'seconds', 0.0) + time.perf_counter() - start
+
+
+# Prazo (time.monotonic) da requisicao atendida na thread; None = sem prazo
+request_deadline = threading.local()
+# Rotas que transferem corpo ou resposta longos: sem prazo total, so timeout de socket
+UNBOUNDED_PATHS = ('/api/lists/export', '/api/lists/import', '/api/images', EVENTS_PATH)
+
+
+def time_left():
+    """Segundos ate o prazo da requisicao atual (None se nao houver prazo)"""
+    at = getattr(request_deadline, 'at', None)
+    return None if at is None else at - time.monotonic()
+
+
+def deadline_expired():
+    """Prazo da requisicao atual ja passou (progress handler do SQLite: verdadeiro interrompe)"""
+    at = getattr(request_deadline, 'at', None)
+    return at is not None and time.monotonic() > at
+
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor que soma em `sql_timer` o tempo de execute e dos fetch"""
+    
+    def execute(self, *args):
+        start = time.perf_counter()
+        try:
+            return super().execute(*args)
+        finally:
+            add_sql_time(start)
+    
+    def executemany(self, *args):
+        start = time.perf_counter()
+        try:
+            return super().executemany(*args)
+        finally:
+            add_sql_time(start)
+    
+    def fetchone(self):
+        start = time.perf_counter()
+        try:
+            return super().fetchone()
+        finally:
+            add_sql_time(start)
+    
+    def fetchmany(self, *args):
+        start = time.perf_counter()
+        try:
+            return super().fetchmany(*args)
+        finally:
+            add_sql_time(start)
+    
+    def fetchall(self):
+        start = time.perf_counter()
+        try:
+            return super().fetchall()
+        finally:
+            add_sql_time(start)
+    
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            return super().__next__()
+        finally:
+            add_sql_time(start)
+
+
+class TimedConnection(sqlite3.Connection):
+    """Conexao cujos cursores (inclusive os de conn.execute) sao TimedCursor"""
+    
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+    
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+    
+    def executemany(self, sql, parameters):
+        return self.cursor().executemany(sql, parameters)
+    
+    def commit(self):
+        start = time.perf_counter()
+        try:
+            return super().commit()
+        finally:
+            add_sql_time(start)
+    
+    def rollback(self):
+        start = time.perf_counter()
+        try:
+            return super().rollback()
+        finally:
+            add_sql_time(start)
+
+
+class CountingWriter:
+    """Repassa as escritas para o socket contando os bytes enviados"""
+    
+    def __init__(self, raw):
+        self.raw = raw
+        self.count = 0
+    
+    def write(self, data):
+        self.count += len(data)
+        return self.raw.write(data)
+    
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+
+def route_label(path):
+    """Rota da requisicao sem ids, para os rotulos das metricas nao crescerem sem limite"""
+    if not path.startswith('/api/') and path != METRICS_PATH:
+        return 'static'
+    if path.startswith('/api/cep/'):
+        return '/api/cep/{cep}'
+    if path.startswith(IMAGES_URL_PREFIX):
+        return IMAGES_URL_PREFIX + '{key}'
+    route = '/'.join('{id}' if part.isdigit() else part for part in path.split('/'))
+    return route if route in METRIC_ROUTES else '/api/other'
+
+
+class ConnectionPool:
+    """Pool de conexoes SQLite de longa duracao
+    
+    As conexoes sao criadas sob demanda ate `size` e ficam abertas com WAL,
+    synchronous=NORMAL, mmap e cache de statements. `connection()` sempre
+    devolve a conexao ao pool, desfazendo transacoes nao confirmadas.
+    """
+    
+    def __init__(self, db_name, size=DB_POOL_SIZE):
+        self.db_name = db_name
+        self.size = max(1, size)
+        self.idle = queue.LifoQueue()
+        self.lock = threading.Lock()
+        self.created = 0
+    
+    def connect(self):
+        """Abre uma nova conexao com os pragmas de desempenho"""
+        conn = sqlite3.connect(
+            self.db_name,
+            timeout=DB_BUSY_TIMEOUT,
+            check_same_thread=False,
+            cached_statements=DB_CACHED_STATEMENTS,
+            factory=TimedConnection
+        )
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA mmap_size={DB_MMAP_SIZE}')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        # Consulta que passar do prazo da requisicao falha com "interrupted"
+        conn.set_progress_handler(deadline_expired, DEADLINE_CHECK_OPS)
+        return conn
+    
+    def acquire(self):
+        """Pega uma conexao livre, cria uma nova ou espera uma ser devolvida"""
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            pass
+        
+        with self.lock:
+            can_create = self.created < self.size
+            if can_create:
+                self.created += 1
+        
+        if not can_create:
+            return self.idle.get()
+        
+        try:
+            return self.connect()
+        except Exception:
+            with self.lock:
+                self.created -= 1
+            raise
+    
+    def release(self, conn):
+        """Devolve a conexao ao pool (descarta se estiver quebrada)"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self.discard(conn)
+            return
+        self.idle.put(conn)
+    
+    def discard(self, conn):
+        """Fecha uma conexao e libera sua vaga no pool"""
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self.lock:
+            self.created -= 1
+    
+    @contextlib.contextmanager
+    def connection(self):
+        """Context manager: `with db_pool.connection() as conn: ...`"""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+    
+    def close_all(self):
+        """Fecha todas as conexoes ociosas"""
+        while True:
+            try:
+                conn = self.idle.get_nowait()
+            except queue.Empty:
+                return
+            self.discard(conn)
+
+
+db_pool = ConnectionPool(DB_NAME)
+
+
+def shard_path(index, count, shard_dir=SHARD_DIR):
+    """Arquivo do shard `index` de um particionamento em `count` shards"""
+    return os.path.join(shard_dir, f'projects-{index:02d}-of-{count:02d}.db')
+
+
+class ProjectShards:
+    """Escolhe o banco dos projetos de cada usuario
+    
+    Com `count` 0 tudo fica no banco principal (`db_pool`). Com `count` N
+    os projetos do usuario, com o indice FTS, as estatisticas e a versao da
+    lista, ficam no arquivo `user_id % N`. Cada shard tem seu proprio pool e
+    seu proprio lock de escrita: escritas de usuarios em shards diferentes
+    nao esperam umas pelas outras.
+    """
+    
+    def __init__(self, count=SHARD_COUNT, shard_dir=SHARD_DIR, pool_size=DB_POOL_SIZE):
+        self.count = max(0, count)
+        self.pools = [ConnectionPool(shard_path(i, self.count, shard_dir), size=pool_size)
+                      for i in range(self.count)]
+    
+    def pool(self, user_id):
+        if not self.count:
+            return db_pool
+        return self.pools[user_id % self.count]
+    
+    def connection(self, user_id):
+        """Context manager com uma conexao do banco dos projetos do usuario"""
+        return self.pool(user_id).connection()
+    
+    def close_all(self):
+        for pool in self.pools:
+            pool.close_all()
+
+
+project_shards = ProjectShards()
+
+
+class ImageStore:
+    """Imagens gravadas uma unica vez em disco, nomeadas pelo sha256
+    
+    A chave e `<sha256>.<extensao>`; o arquivo fica em `root/<2 primeiros
+    caracteres>/<chave>`. Conteudo identico gera a mesma chave, entao a mesma
+    imagem enviada varias vezes ocupa espaco uma vez so.
+    """
+    
+    def __init__(self, root):
+        self.root = root
+    
+    def path_for(self, key):
+        return os.path.join(self.root, key[:2], key)
+    
+    def put(self, data, content_type):
+        """Grava os bytes (se ainda nao existirem) e retorna a chave"""
+        extension = IMAGE_TYPES[content_type]
+        key = f'{hashlib.sha256(data).hexdigest()}.{extension}'
+        path = self.path_for(key)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Escrita atomica: outro worker nunca le um arquivo pela metade
+            tmp_path = f'{path}.{threading.get_ident()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        return key
+    
+    def put_stream(self, stream, length, content_type):
+        """Grava `length` bytes lidos de `stream` em blocos, sem juntar tudo em memoria
+        
+        O sha256 e calculado durante a leitura; o arquivo temporario vira a
+        imagem definitiva (ou e descartado, se ela ja existir) no final.
+        """
+        extension = IMAGE_TYPES.get(content_type)
+        if extension is None:
+            raise ValueError('Apenas PNG, JPG, GIF ou WebP sao permitidos')
+        if length <= 0:
+            raise ValueError('Imagem vazia')
+        if length > MAX_IMAGE_BYTES:
+            raise ValueError('Imagem muito grande (max 2MB)')
+        
+        os.makedirs(self.root, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix='.tmp')
+        try:
+            digest = hashlib.sha256()
+            remaining = length
+            with os.fdopen(fd, 'wb') as f:
+                while remaining > 0:
+                    chunk = stream.read(min(IMAGE_CHUNK_SIZE, remaining))
+                    if not chunk:
+                        raise ConnectionError('Upload interrompido')
+                    if remaining == length and not self.signature_matches(chunk, extension):
+                        raise ValueError('Conteudo nao corresponde ao tipo da imagem')
+                    remaining -= len(chunk)
+                    digest.update(chunk)
+                    f.write(chunk)
+            
+            key = f'{digest.hexdigest()}.{extension}'
+            path = self.path_for(key)
+            if os.path.exists(path):
+                os.remove(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp_path, path)
+            return key
+        except BaseException:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(tmp_path)
+            raise
+    
+    @staticmethod
+    def signature_matches(head, extension):
+        if extension == 'webp' and head[8:12] != b'WEBP':
+            return False
+        return head.startswith(IMAGE_SIGNATURES[extension])
+    
+    def put_data_url(self, data_url):
+        """Decodifica um data URL base64 e grava a imagem"""
+        match = DATA_URL_RE.match(data_url)
+        if not match:
+            raise ValueError('Formato de imagem invalido')
+        content_type = match.group(1).lower()
+        if content_type not in IMAGE_TYPES:
+            raise ValueError('Apenas PNG, JPG, GIF ou WebP sao permitidos')
+        try:
+            data = base64.b64decode(data_url[match.end():], validate=True)
+        except ValueError:
+            raise ValueError('Imagem em base64 invalida')
+        if len(data) > MAX_IMAGE_BYTES:
+            raise ValueError('Imagem muito grande (max 2MB)')
+        return self.put(data, content_type)
+    
+    def key_from_input(self, image_path):
+        """Converte o campo image_path recebido em chave do armazenamento
+        
+        Aceita um data URL novo, a URL de uma imagem ja armazenada (o front
+        reenvia o que recebeu da listagem) ou vazio para "sem imagem".
+        """
+        if not image_path:
+            return None
+        if image_path.startswith(IMAGES_URL_PREFIX):
+            key = image_path[len(IMAGES_URL_PREFIX):]
+            if not IMAGE_KEY_RE.match(key) or not os.path.exists(self.path_for(key)):
+                raise ValueError('Imagem nao encontrada')
+            return key
+        return self.put_data_url(image_path)
+
+
+image_store = ImageStore(IMAGES_DIR)
+
+
+class StaticAsset:
+    """Conteudo de um arquivo estatico e suas versoes comprimidas"""
+    
+    def __init__(self, fs_path, stat):
+        with open(fs_path, 'rb') as f:
+            body = f.read()
+        self.mtime = stat.st_mtime
+        self.size = stat.st_size
+        self.checked_at = time.monotonic()
+        self.content_type = mimetypes.guess_type(fs_path)[0] or 'application/octet-stream'
+        if self.content_type.startswith('text/') or self.content_type == 'application/javascript':
+            self.content_type += '; charset=utf-8'
+        self.last_modified = formatdate(stat.st_mtime, usegmt=True)
+        
+        digest = hashlib.sha256(body).hexdigest()[:20]
+        # encoding -> (bytes, ETag); cada codificacao tem ETag proprio
+        self.variants = {'identity': (body, f'"{digest}"')}
+        if fs_path.endswith(STATIC_COMPRESSIBLE):
+            compressed = gzip.compress(body, compresslevel=9, mtime=0)
+            if len(compressed) < len(body):
+                self.variants['gzip'] = (compressed, f'"{digest}-gz"')
+            if brotli is not None:
+                compressed = brotli.compress(body, quality=11)
+                if len(compressed) < len(body):
+                    self.variants['br'] = (compressed, f'"{digest}-br"')
+        self.nbytes = sum(len(data) for data, _ in self.variants.values())
+    
+    def etags(self):
+        return [etag for _, etag in self.variants.values()]
+    
+    def choose(self, accept_encoding):
+        """Escolhe a codificacao pelo Accept-Encoding (br > gzip > identity)"""
+        accepted = {}
+        for part in (accept_encoding or '').split(','):
+            name, _, params = part.strip().partition(';')
+            quality = 1.0
+            params = params.strip()
+            if params.startswith('q='):
+                try:
+                    quality = float(params[2:])
+                except ValueError:
+                    quality = 0.0
+            if name:
+                accepted[name.lower()] = quality
+        for encoding in ('br', 'gzip'):
+            q = accepted.get(encoding, accepted.get('*', 0.0))
+            if encoding in self.variants and q > 0:
+                return encoding
+        return 'identity'
+
+
+class StaticAssetCache:
+    """Cache em memoria dos arquivos estaticos
+    
+    Cada arquivo e lido e comprimido uma vez; no maximo a cada
+    STATIC_CHECK_INTERVAL segundos o mtime/tamanho e conferido e, se mudou,
+    o arquivo e recarregado. O total fica em `max_bytes` (LRU) e arquivos
+    dentro de `exclude` (imagens enviadas pelos usuarios) nao entram: sao
+    servidos direto do disco.
+    """
+    
+    def __init__(self, root='.', max_bytes=STATIC_CACHE_MAX_BYTES, exclude=(IMAGES_DIR,)):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.exclude = tuple(os.path.abspath(path) + os.sep for path in exclude)
+        self.assets = OrderedDict()  # caminho absoluto -> StaticAsset
+        self.nbytes = 0
+        self.lock = threading.Lock()
+    
+    def get(self, fs_path):
+        """Retorna o StaticAsset do arquivo (ou None se nao for cacheavel)"""
+        fs_path = os.path.abspath(fs_path)
+        with self.lock:
+            asset = self.assets.get(fs_path)
+            if asset is not None:
+                self.assets.move_to_end(fs_path)
+        now = time.monotonic()
+        if asset and now - asset.checked_at < STATIC_CHECK_INTERVAL:
+            return asset
+        if fs_path.startswith(self.exclude):
+            return None
+        
+        try:
+            stat = os.stat(fs_path)
+        except OSError:
+            self.discard(fs_path)
+            return None
+        if not os.path.isfile(fs_path) or stat.st_size > STATIC_MAX_FILE_SIZE:
+            return None
+        
+        if asset and asset.mtime == stat.st_mtime and asset.size == stat.st_size:
+            asset.checked_at = now
+            return asset
+        
+        asset = StaticAsset(fs_path, stat)
+        if asset.nbytes > self.max_bytes:
+            return None
+        with self.lock:
+            old = self.assets.pop(fs_path, None)
+            if old is not None:
+                self.nbytes -= old.nbytes
+            self.assets[fs_path] = asset
+            self.nbytes += asset.nbytes
+            while self.nbytes > self.max_bytes:
+                _, evicted = self.assets.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+        return asset
+    
+    def discard(self, fs_path):
+        with self.lock:
+            asset = self.assets.pop(fs_path, None)
+            if asset is not None:
+                self.nbytes -= asset.nbytes
+    
+    def preload(self, names):
+        for name in names:
+            self.get(os.path.join(self.root, name))
+
+
+static_cache = StaticAssetCache()
+
+
+class BuildManifest:
+    """Arquivos do build do front (manifest.json do scripts/build_assets.py)
+    
+    Paginas (`lista.html`) sao servidas do build com o mesmo caminho; assets
+    com hash no nome (`assets/auth.<hash>.js`) nunca mudam de conteudo e vao
+    com cache imutavel. O manifest e relido quando muda (novo build com o
+    servidor no ar).
+    
+    Se algum fonte mudou depois do build (sha256 diferente do manifest) as
+    paginas voltam a sair dos fontes ate o proximo build, em vez de servir
+    o build velho; os assets com hash continuam disponiveis para paginas ja
+    abertas.
+    """
+    
+    def __init__(self, root=BUILD_DIR, source_root='.'):
+        self.root = root
+        self.source_root = source_root
+        self.path = os.path.join(root, BUILD_MANIFEST)
+        self.mtime = None
+        self.checked_at = float('-inf')
+        self.pages = {}  # caminho da pagina -> arquivo no build
+        self.assets = set()  # caminhos com hash servidos como imutaveis
+        self.sources = {}  # arquivo fonte -> sha256 do conteudo usado no build
+        self.source_stats = {}  # arquivo fonte -> ((mtime, tamanho), confere com o build)
+        self.stale = []
+        self.lock = threading.Lock()
+    
+    def refresh(self):
+        now = time.monotonic()
+        if now - self.checked_at < STATIC_CHECK_INTERVAL:
+            return
+        with self.lock:
+            self.checked_at = now
+            try:
+                mtime = os.stat(self.path).st_mtime
+            except OSError:
+                mtime = None
+            if mtime != self.mtime:
+                self.mtime = mtime
+                self.load(mtime)
+            self.check_sources()
+    
+    def load(self, mtime):
+        """Le o manifest (chamado com o lock)"""
+        pages, assets, sources = {}, set(), {}
+        if mtime is not None:
+            try:
+                with open(self.path, encoding='utf-8') as f:
+                    manifest = json.load(f)
+                for name, entry in manifest.get('pages', {}).items():
+                    pages[name] = entry['output']
+                    sources[name] = entry['source_sha256']
+                for name, entry in manifest.get('assets', {}).items():
+                    assets.add(entry['output'])
+                    sources[name] = entry['source_sha256']
+            except (OSError, ValueError, KeyError, AttributeError) as e:
+                logger.error('manifest do build invalido (%s): servindo os arquivos fonte', e)
+                pages, assets, sources = {}, set(), {}
+        self.pages, self.assets, self.sources = pages, assets, sources
+        self.source_stats = {}
+    
+    def check_sources(self):
+        """Confere os fontes com o build (chamado com o lock)
+        
+        O sha256 so e recalculado quando o mtime/tamanho do fonte muda.
+        """
+        stale = []
+        for name, digest in self.sources.items():
+            path = os.path.join(self.source_root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                stale.append(name)
+                continue
+            key = (stat.st_mtime, stat.st_size)
+            known = self.source_stats.get(name)
+            if known is None or known[0] != key:
+                try:
+                    with open(path, 'rb') as f:
+                        known = (key, hashlib.sha256(f.read()).hexdigest() == digest)
+                except OSError:
+                    known = (key, False)
+                self.source_stats[name] = known
+            if not known[1]:
+                stale.append(name)
+        if stale and stale != self.stale:
+            logger.warning('build do front desatualizado (%s): servindo os arquivos fonte ate '
+                           'rodar python scripts/build_assets.py', ', '.join(stale))
+        elif self.stale and not stale:
+            logger.info('build do front em dia: servindo de %s/', self.root)
+        self.stale = stale
+    
+    def resolve(self, path):
+        """(arquivo no build, imutavel) para o caminho pedido, ou None se nao for do build"""
+        self.refresh()
+        name = path.lstrip('/')
+        if name in self.assets:
+            return os.path.join(self.root, name), True
+        # Build desatualizado: a pagina e seus assets saem dos fontes
+        if name in self.pages and not self.stale:
+            return os.path.join(self.root, self.pages[name]), False
+        return None
+    
+    def files(self):
+        """Arquivos do build (para o preload do cache estatico)"""
+        self.refresh()
+        return [os.path.join(self.root, name) for name in [*self.pages.values(), *self.assets]]
+
+
+build_manifest = BuildManifest()
+
+
+class CepResolver:
+    """Consulta de CEP com cache em memoria (LRU + TTL), cache persistente no
+    SQLite, cache negativo para CEPs inexistentes e coalescencia de consultas
+    
+    `resolve()` retorna o dict do ViaCEP, None se o CEP nao existe, ou levanta
+    excecao se o ViaCEP falhar (falhas nunca sao cacheadas). Varias threads
+    pedindo o mesmo CEP ao mesmo tempo esperam uma unica chamada ao ViaCEP.
+    """
+    
+    def __init__(self, url_template=VIACEP_URL, cache_size=CEP_CACHE_SIZE,
+                 ttl=CEP_CACHE_TTL, negative_ttl=CEP_NEGATIVE_TTL, timeout=CEP_TIMEOUT):
+        self.url_template = url_template
+        self.cache_size = cache_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.timeout = timeout
+        self.memory = OrderedDict()  # cep -> (expira_em, dados ou None)
+        self.inflight = {}  # cep -> Future da consulta em andamento
+        self.lock = threading.Lock()
+    
+    def resolve(self, cep):
+        with self.lock:
+            cached = self.memory.get(cep)
+            if cached and cached[0] > time.time():
+                self.memory.move_to_end(cep)
+                return cached[1]
+            
+            future = self.inflight.get(cep)
+            leader = future is None
+            if leader:
+                future = Future()
+                self.inflight[cep] = future
+        
+        if not leader:
+            return future.result(timeout=self.request_timeout() + 1)
+        
+        try:
+            result = self.load(cep)
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                self.inflight.pop(cep, None)
+    
+    def load(self, cep):
+        """Cache persistente ou ViaCEP; guarda o resultado nos dois caches"""
+        now = time.time()
+        with db_pool.connection() as conn:
+            row = conn.execute(
+                'SELECT data, expires_at FROM cep_cache WHERE cep = ?', (cep,)
+            ).fetchone()
+        if row and row[1] > now:
+            data = json.loads(row[0]) if row[0] else None
+            self.remember(cep, data, row[1])
+            return data
+        
+        start = time.perf_counter()
+        try:
+            timeout = self.request_timeout()
+            with urllib.request.urlopen(self.url_template.format(cep=cep), timeout=timeout) as response:
+                data = json.loads(response.read().decode('utf-8'))
+        except Exception:
+            metrics.observe_upstream('viacep', 'error', time.perf_counter() - start)
+            raise
+        if 'erro' in data:
+            data = None
+        metrics.observe_upstream('viacep', 'found' if data else 'not_found', time.perf_counter() - start)
+        
+        expires_at = now + (self.ttl if data else self.negative_ttl)
+        with db_pool.connection() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO cep_cache (cep, data, expires_at) VALUES (?, ?, ?)',
+                (cep, json.dumps(data, ensure_ascii=False) if data else None, expires_at)
+            )
+            conn.commit()
+        self.remember(cep, data, expires_at)
+        return data
+    
+    def request_timeout(self):
+        """Timeout do ViaCEP limitado ao que resta do prazo da requisicao"""
+        left = time_left()
+        if left is None:
+            return self.timeout
+        if left <= 0:
+            raise TimeoutError('Prazo da requisicao esgotado')
+        return min(self.timeout, left)
+    
+    def remember(self, cep, data, expires_at):
+        with self.lock:
+            self.memory[cep] = (expires_at, data)
+            self.memory.move_to_end(cep)
+            while len(self.memory) > self.cache_size:
+                self.memory.popitem(last=False)
+
+
+cep_resolver = CepResolver()
+
+
+class TokenCache:
+    """Cache de tokens JWT ja verificados, com revogacao
+    
+    A chave e o sha256 do token (o token em si nao fica em memoria) e cada
+    entrada vale ate o `exp` do token, entao um acerto dispensa a verificacao
+    HMAC e o parse do JSON sem aceitar token expirado. `revoke()` invalida um
+    token (logout) e `revoke_user()` todos os tokens emitidos ate agora para
+    o usuario (troca de senha); as revogacoes ficam apenas em memoria.
+    `SqliteTokenCache` guarda as revogacoes no banco (varios processos).
+    """
+    
+    def __init__(self, size=TOKEN_CACHE_SIZE, secret=SECRET_KEY):
+        self.size = size
+        self.secret = secret
+        self.entries = OrderedDict()  # digest -> (exp, user_id)
+        self.revoked = {}  # digest -> exp
+        self.revoked_before = {}  # user_id -> tokens com iat anterior sao invalidos
+        self.lock = threading.Lock()
+    
+    @staticmethod
+    def digest(token):
+        return hashlib.sha256(token.encode('utf-8', 'replace')).digest()
+    
+    def decode(self, token):
+        """Verificacao completa do JWT; None se invalido ou expirado"""
+        try:
+            return jwt.decode(token, self.secret, algorithms=['HS256'])
+        except jwt.InvalidTokenError:
+            return None
+    
+    def verify(self, token):
+        """Retorna o user_id do token ou None"""
+        key = self.digest(token)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                if entry[0] > time.time():
+                    self.entries.move_to_end(key)
+                    return entry[1]
+                del self.entries[key]
+        
+        payload = self.decode(token)
+        if payload is None:
+            return None
+        user_id = payload.get('user_id')
+        exp = payload.get('exp')
+        with self.lock:
+            if key in self.revoked or payload.get('iat', 0) < self.revoked_before.get(user_id, 0):
+                return None
+            if user_id is not None and isinstance(exp, (int, float)):
+                self.entries[key] = (exp, user_id)
+                while len(self.entries) > self.size:
+                    self.entries.popitem(last=False)
+        return user_id
+    
+    def revoke(self, token):
+        """Invalida um token ate a sua expiracao (logout)"""
+        payload = self.decode(token)
+        if payload is None:
+            return False
+        self.forget_token(self.digest(token), payload.get('exp', time.time() + TOKEN_MAX_AGE))
+        return True
+    
+    def revoke_user(self, user_id):
+        """Invalida todos os tokens ja emitidos para o usuario (troca de senha)"""
+        # iat do JWT tem resolucao de segundos: tokens emitidos neste segundo tambem caem
+        self.forget_user(user_id, int(time.time()) + 1)
+    
+    def forget_token(self, key, exp):
+        """Aplica a revogacao de um token na memoria"""
+        now = time.time()
+        with self.lock:
+            self.entries.pop(key, None)
+            self.revoked[key] = exp
+            # Tokens revogados que ja expiraram nao precisam mais ser lembrados
+            for digest, expires in list(self.revoked.items()):
+                if expires <= now:
+                    del self.revoked[digest]
+    
+    def forget_user(self, user_id, before):
+        """Aplica na memoria a revogacao dos tokens do usuario com iat < `before`"""
+        with self.lock:
+            self.revoked_before[user_id] = max(before, self.revoked_before.get(user_id, 0))
+            for key in [k for k, entry in self.entries.items() if entry[1] == user_id]:
+                del self.entries[key]
+
+
+class SqliteTokenCache(TokenCache):
+    """Mesmo cache, com as revogacoes na tabela token_revocations (varios processos)
+    
+    Cada revogacao vira uma linha; os processos aplicam na memoria as linhas
+    novas (id maior que a ultima lida) antes de verificar um token. A leitura
+    acontece quando `generation` - contador em memoria compartilhada, criado
+    antes do fork e incrementado a cada revogacao - muda, e no maximo a cada
+    TOKEN_REVOCATIONS_SYNC segundos sem ele (outros servidores no mesmo banco).
+    """
+    
+    PRUNE_EVERY = 100  # revogacoes gravadas entre limpezas das ja expiradas
+    
+    def __init__(self, size=TOKEN_CACHE_SIZE, secret=SECRET_KEY, generation=None,
+                 interval=TOKEN_REVOCATIONS_SYNC):
+        super().__init__(size, secret)
+        self.generation = generation
+        self.interval = interval
+        self.seen_generation = None
+        self.synced_at = float('-inf')
+        self.last_id = 0
+        self.sync_lock = threading.Lock()
+        self.revocations = 0
+    
+    def sync(self):
+        """Aplica as revogacoes gravadas por outros processos"""
+        generation = self.generation.value if self.generation is not None else None
+        if generation == self.seen_generation and time.monotonic() - self.synced_at < self.interval:
+            return
+        with self.sync_lock:
+            synced_at = time.monotonic()
+            with db_pool.connection() as conn:
+                rows = conn.execute('''
+                    SELECT id, digest, user_id, revoked_before, expires_at
+                    FROM token_revocations WHERE id > ? ORDER BY id
+                ''', (self.last_id,)).fetchall()
+            for row_id, digest, user_id, revoked_before, expires_at in rows:
+                if digest is not None:
+                    self.forget_token(digest, expires_at)
+                else:
+                    self.forget_user(user_id, revoked_before)
+                self.last_id = row_id
+            # generation lido antes da consulta: revogacao gravada durante ela forca nova leitura
+            self.seen_generation = generation
+            self.synced_at = synced_at
+    
+    def record(self, digest=None, user_id=None, revoked_before=None, expires_at=0):
+        with db_pool.connection() as conn:
+            conn.execute('''
+                INSERT INTO token_revocations (digest, user_id, revoked_before, expires_at)
+                VALUES (?, ?, ?, ?)
+            ''', (digest, user_id, revoked_before, expires_at))
+            self.revocations += 1
+            if self.revocations % self.PRUNE_EVERY == 0:
+                conn.execute('DELETE FROM token_revocations WHERE expires_at <= ?', (time.time(),))
+            conn.commit()
+        if self.generation is not None:
+            with self.generation.get_lock():
+                self.generation.value += 1
+    
+    def verify(self, token):
+        self.sync()
+        return super().verify(token)
+    
+    def revoke(self, token):
+        payload = self.decode(token)
+        if payload is None:
+            return False
+        key = self.digest(token)
+        exp = payload.get('exp', time.time() + TOKEN_MAX_AGE)
+        self.record(digest=key, expires_at=exp)
+        self.forget_token(key, exp)
+        return True
+    
+    def revoke_user(self, user_id):
+        before = int(time.time()) + 1
+        # Tokens emitidos antes de `before` expiram no maximo TOKEN_MAX_AGE depois
+        self.record(user_id=user_id, revoked_before=before, expires_at=before + TOKEN_MAX_AGE)
+        self.forget_user(user_id, before)
+
+
+def create_token_cache(backend=TOKEN_REVOCATIONS_BACKEND, generation=None):
+    """Cache de tokens com as revogacoes no backend escolhido"""
+    if backend == 'memory':
+        return TokenCache()
+    if backend == 'sqlite':
+        return SqliteTokenCache(generation=generation)
+    raise ValueError(f'Backend de revogacao de tokens invalido: {backend}')
+
+
+token_cache = create_token_cache()
+
+
+def sliding_window_count(state, now, window):
+    """Estimativa de falhas nos ultimos `window` segundos
+    
+    `state` = (janela_atual, falhas_na_janela, falhas_na_anterior), com janelas
+    fixas de `window` segundos; a janela anterior entra proporcionalmente ao
+    quanto dela ainda cabe na janela deslizante.
+    """
+    window_id, count, previous = state
+    current = int(now // window)
+    if window_id == current - 1:
+        count, previous = 0, count
+    elif window_id != current:
+        return 0
+    return count + previous * (1 - (now % window) / window)
+
+
+class LoginRateLimiter:
+    """Limite de falhas de login por chave (IP) em memoria
+    
+    Cada chave guarda so uma tupla (contador de janela deslizante), o total de
+    chaves e limitado por LRU e o dicionario e dividido em shards com lock
+    proprio para threads diferentes nao disputarem o mesmo lock.
+    """
+    
+    def __init__(self, max_attempts=MAX_LOGIN_ATTEMPTS, window=LOCKOUT_TIME,
+                 size=LOGIN_LIMITER_SIZE, shards=LOGIN_LIMITER_SHARDS):
+        self.max_attempts = max_attempts
+        self.window = window
+        self.shard_size = max(1, size // shards)
+        self.shards = [(OrderedDict(), threading.Lock()) for _ in range(shards)]
+    
+    def shard(self, key):
+        return self.shards[hash(key) % len(self.shards)]
+    
+    def blocked(self, key):
+        entries, lock = self.shard(key)
+        with lock:
+            state = entries.get(key)
+        if state is None:
+            return False
+        return sliding_window_count(state, time.time(), self.window) >= self.max_attempts
+    
+    def record_failure(self, key):
+        current = int(time.time() // self.window)
+        entries, lock = self.shard(key)
+        with lock:
+            window_id, count, previous = entries.pop(key, (current, 0, 0))
+            if window_id == current - 1:
+                count, previous = 0, count
+            elif window_id != current:
+                count, previous = 0, 0
+            entries[key] = (current, count + 1, previous)
+            if len(entries) > self.shard_size:
+                entries.popitem(last=False)
+    
+    def reset(self, key):
+        entries, lock = self.shard(key)
+        with lock:
+            entries.pop(key, None)
+
+
+class SqliteLoginRateLimiter:
+    """Mesmo limite, guardado na tabela login_attempts (varios processos)"""
+    
+    PRUNE_EVERY = 100  # falhas registradas entre limpezas de chaves expiradas
+    
+    def __init__(self, max_attempts=MAX_LOGIN_ATTEMPTS, window=LOCKOUT_TIME, size=LOGIN_LIMITER_SIZE):
+        self.max_attempts = max_attempts
+        self.window = window
+        self.size = size
+        self.failures = 0
+    
+    def blocked(self, key):
+        with db_pool.connection() as conn:
+            state = conn.execute(
+                'SELECT window_id, count, previous FROM login_attempts WHERE key = ?', (key,)
+            ).fetchone()
+        if state is None:
+            return False
+        return sliding_window_count(state, time.time(), self.window) >= self.max_attempts
+    
+    def record_failure(self, key):
+        current = int(time.time() // self.window)
+        with db_pool.connection() as conn:
+            # Um unico UPSERT: atomico entre processos sem BEGIN IMMEDIATE
+            conn.execute('''
+                INSERT INTO login_attempts (key, window_id, count, previous) VALUES (?, ?, 1, 0)
+                ON CONFLICT(key) DO UPDATE SET
+                    previous = CASE window_id WHEN excluded.window_id THEN previous
+                                              WHEN excluded.window_id - 1 THEN count ELSE 0 END,
+                    count = CASE window_id WHEN excluded.window_id THEN count + 1 ELSE 1 END,
+                    window_id = excluded.window_id
+            ''', (key, current))
+            self.failures += 1
+            if self.failures % self.PRUNE_EVERY == 0:
+                conn.execute('DELETE FROM login_attempts WHERE window_id < ?', (current - 1,))
+                conn.execute('''
+                    DELETE FROM login_attempts WHERE key IN (
+                        SELECT key FROM login_attempts ORDER BY window_id DESC LIMIT -1 OFFSET ?
+                    )
+                ''', (self.size,))
+            conn.commit()
+    
+    def reset(self, key):
+        with db_pool.connection() as conn:
+            conn.execute('DELETE FROM login_attempts WHERE key = ?', (key,))
+            conn.commit()
+
+
+def create_login_limiter(backend=LOGIN_LIMITER_BACKEND):
+    """Limitador de login do backend escolhido"""
+    if backend == 'memory':
+        return LoginRateLimiter()
+    if backend == 'sqlite':
+        return SqliteLoginRateLimiter()
+    raise ValueError(f'Backend de rate limiting invalido: {backend}')
+
+
+login_limiter = create_login_limiter()
+
+
+def hash_password(password, n=PASSWORD_SCRYPT_N, r=PASSWORD_SCRYPT_R, p=PASSWORD_SCRYPT_P):
+    """Hash scrypt com salt aleatorio no formato scrypt$n$r$p$salt$hash"""
+    salt = os.urandom(PASSWORD_SALT_BYTES)
+    digest = hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, dklen=32)
+    return f'scrypt${n}${r}${p}${salt.hex()}${digest.hex()}'
+
+
+def check_password(password, stored):
+    """Confere a senha com o hash gravado
+    
+    Retorna (confere, hash novo). O hash novo so vem quando a senha confere
+    e o gravado esta em formato antigo (SHA-256 sem salt) ou com parametros
+    diferentes dos atuais; quem chama grava no lugar do antigo.
+    """
+    if stored.startswith('scrypt$'):
+        try:
+            _, n, r, p, salt, expected = stored.split('$')
+            n, r, p = int(n), int(r), int(p)
+            digest = hashlib.scrypt(password.encode(), salt=bytes.fromhex(salt), n=n, r=r, p=p, dklen=32)
+        except ValueError:
+            return False, None
+        if not hmac.compare_digest(digest.hex(), expected):
+            return False, None
+        current = (n, r, p) == (PASSWORD_SCRYPT_N, PASSWORD_SCRYPT_R, PASSWORD_SCRYPT_P)
+        return True, None if current else hash_password(password)
+    
+    # Formato legado: sha256 hex sem salt
+    if not hmac.compare_digest(hashlib.sha256(password.encode()).hexdigest(), stored):
+        return False, None
+    return True, hash_password(password)
+
+
+def lower_priority():
+    """Inicializador dos processos de hash"""
+    if hasattr(os, 'nice'):
+        os.nice(PASSWORD_NICE)
+
+
+class PasswordHasherBusy(Exception):
+    """Fila de hashing cheia (ou hash demorou demais): responder 503"""
+
+
+class PasswordHasher:
+    """Hash e verificacao de senhas em um pool de processos com fila limitada
+    
+    O scrypt e caro de proposito; rodando fora dos workers HTTP (e com
+    prioridade menor) uma rajada de logins nao trava as outras rotas. No
+    maximo `processes + max_pending` requisicoes esperam por um hash ao mesmo
+    tempo; as demais falham na hora com PasswordHasherBusy.
+    """
+    
+    def __init__(self, processes=PASSWORD_PROCESSES, max_pending=PASSWORD_QUEUE_SIZE, timeout=PASSWORD_TIMEOUT):
+        self.processes = max(1, processes)
+        self.slots = threading.BoundedSemaphore(self.processes + max(0, max_pending))
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.executor = None
+    
+    def get_executor(self):
+        with self.lock:
+            if self.executor is None:
+                # spawn: fork de um processo com varias threads pode herdar locks presos
+                self.executor = ProcessPoolExecutor(
+                    self.processes, mp_context=multiprocessing.get_context('spawn'),
+                    initializer=lower_priority
+                )
+            return self.executor
+    
+    def run(self, fn, *args):
+        if not self.slots.acquire(blocking=False):
+            raise PasswordHasherBusy()
+        try:
+            executor = self.get_executor()
+            try:
+                return executor.submit(fn, *args).result(timeout=self.timeout)
+            except FutureTimeoutError:
+                raise PasswordHasherBusy()
+            except BrokenProcessPool:
+                # Processo morto (ex.: OOM): o proximo pedido cria outro pool
+                with self.lock:
+                    if self.executor is executor:
+                        self.executor = None
+                executor.shutdown(wait=False)
+                raise
+        finally:
+            self.slots.release()
+    
+    def hash(self, password):
+        return self.run(hash_password, password)
+    
+    def check(self, password, stored):
+        return self.run(check_password, password, stored)
+    
+    def shutdown(self):
+        with self.lock:
+            executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+
+password_hasher = PasswordHasher()
+
+
+def image_url(image_key):
+    """URL publica de uma imagem armazenada"""
+    return f'{IMAGES_URL_PREFIX}{image_key}' if image_key else None
+
+
+def bump_projects_version(conn, user_id):
+    """Incrementa a versao da lista do usuario (chamar na mesma transacao da alteracao)"""
+    conn.execute('''
+        INSERT INTO project_versions (user_id, version) VALUES (?, 1)
+        ON CONFLICT (user_id) DO UPDATE SET version = version + 1
+    ''', (user_id,))
+
+
+def project_item(conn, project_id):
+    """Projeto com os campos da listagem (para eventos de alteracao)"""
+    fields = list(LIST_COLUMNS)
+    row = conn.execute(
+        f'SELECT {", ".join(LIST_COLUMNS[f] for f in fields)} FROM projects WHERE id = ?', (project_id,)
+    ).fetchone()
+    if row is None:
+        return None
+    item = dict(zip(fields, row))
+    item['pinned'] = bool(item['pinned'])
+    item['image_path'] = image_url(item['image_path'])
+    return item
+
+
+class ChangeHub:
+    """Pub/sub em memoria das alteracoes de projetos de cada usuario
+    
+    Cada evento recebe um id crescente e fica em um buffer circular com os
+    ultimos `history_size` eventos (de todos os usuarios), usado para retomar
+    um stream a partir do Last-Event-ID. O id leva um prefixo aleatorio da
+    execucao: ids de antes de um reinicio nao sao retomaveis. No modo prefork
+    cada processo teria o seu hub, por isso o endpoint responde 204 nesse modo.
+    """
+    
+    def __init__(self, history_size=SSE_HISTORY_SIZE, queue_size=SSE_QUEUE_SIZE):
+        self.lock = threading.Lock()
+        self.boot = os.urandom(4).hex()
+        self.seq = 0
+        self.history = deque(maxlen=history_size)  # (seq, user_id, mensagem)
+        self.subscribers = {}  # user_id -> set de filas
+        self.queue_size = queue_size
+        self.streams = 0
+    
+    def event_id(self, seq):
+        return f'{self.boot}-{seq}'
+    
+    def publish(self, user_id, event):
+        """Envia um evento aos streams abertos do usuario (nao bloqueia)"""
+        data = json.dumps(event, ensure_ascii=False, separators=(',', ':'))
+        with self.lock:
+            self.seq += 1
+            message = f'id: {self.event_id(self.seq)}\nevent: change\ndata: {data}\n\n'.encode('utf-8')
+            self.history.append((self.seq, user_id, message))
+            subscribers = self.subscribers.get(user_id, ())
+            for subscriber in list(subscribers):
+                if subscriber.qsize() >= self.queue_size:
+                    # Cliente lento: encerra o stream; ele reconecta e retoma pelo historico
+                    subscriber.put(None)
+                    subscribers.discard(subscriber)
+                else:
+                    subscriber.put(message)
+    
+    def subscribe(self, user_id, last_event_id=None, max_streams=None):
+        """Registra um stream do usuario
+        
+        Retorna (fila, eventos perdidos desde last_event_id, id atual); os
+        eventos perdidos sao None se last_event_id nao puder ser retomado.
+        Com `max_streams` streams abertos retorna (None, None, None).
+        """
+        with self.lock:
+            if max_streams is not None and self.streams >= max_streams:
+                return None, None, None
+            backlog = self.backlog(user_id, last_event_id)
+            subscriber = queue.Queue()
+            self.subscribers.setdefault(user_id, set()).add(subscriber)
+            self.streams += 1
+            return subscriber, backlog, self.event_id(self.seq)
+    
+    def unsubscribe(self, user_id, subscriber):
+        with self.lock:
+            subscribers = self.subscribers.get(user_id)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self.subscribers[user_id]
+            self.streams -= 1
+    
+    def backlog(self, user_id, last_event_id):
+        """Mensagens do usuario posteriores a last_event_id (chamar com o lock)"""
+        if not last_event_id:
+            return []
+        boot, _, seq = last_event_id.partition('-')
+        if boot != self.boot or not seq.isdigit() or int(seq) > self.seq:
+            return None
+        first = self.history[0][0] if self.history else self.seq + 1
+        if int(seq) < first - 1:
+            return None  # eventos ja sairam do buffer
+        start = int(seq) - first + 1
+        return [message for _, owner, message in itertools.islice(self.history, start, None) if owner == user_id]
+
+
+change_hub = ChangeHub()
+
+
+def list_etag(user_id, version, query_string):
+    """ETag da listagem: versao da lista + parametros da consulta"""
+    return f'"{user_id}.{version}.{zlib.crc32(query_string.encode("utf-8")):08x}"'
+
+
+def rebalance_ranks(conn, user_id):
+    """Renumera order_index do usuario para 1..N mantendo a ordem atual"""
+    ids = [row[0] for row in conn.execute(
+        'SELECT id FROM projects WHERE user_id = ? ORDER BY pinned DESC, order_index ASC, id ASC',
+        (user_id,)
+    )]
+    conn.executemany(
+        'UPDATE projects SET order_index = ? WHERE id = ?',
+        ((index + 1, project_id) for index, project_id in enumerate(ids))
+    )
+
+
+class RankRebalancer:
+    """Fila de usuarios cujos ranks precisam ser renumerados
+    
+    Uma unica thread em segundo plano processa a fila; pedidos repetidos para
+    o mesmo usuario enquanto ele ainda esta na fila sao ignorados.
+    """
+    
+    def __init__(self):
+        self.pending = set()
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.thread = None
+    
+    def schedule(self, user_id):
+        with self.lock:
+            if user_id in self.pending:
+                return
+            self.pending.add(user_id)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='rank-rebalancer', daemon=True)
+                self.thread.start()
+        self.queue.put(user_id)
+    
+    def run(self):
+        while True:
+            user_id = self.queue.get()
+            with self.lock:
+                self.pending.discard(user_id)
+            try:
+                with project_shards.connection(user_id) as conn:
+                    conn.execute('BEGIN IMMEDIATE')
+                    rebalance_ranks(conn, user_id)
+                    bump_projects_version(conn, user_id)
+                    conn.commit()
+            except Exception as e:
+                logger.error('rebalanceamento de ranks falhou user_id=%s: %s', user_id, e)
+
+
+rank_rebalancer = RankRebalancer()
+
+
+def encode_cursor(pinned, order_index, project_id):
+    """Cursor opaco com a chave (pinned, order_index, id) do ultimo item"""
+    raw = json.dumps([pinned, order_index, project_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Inverso de encode_cursor; ValueError se o cursor for invalido"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        pinned, order_index, project_id = json.loads(raw)
+    except (ValueError, TypeError):
+        raise ValueError('Cursor invalido')
+    if not all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in (pinned, order_index, project_id)):
+        raise ValueError('Cursor invalido')
+    return pinned, order_index, project_id
+
+
+def parse_fields(value):
+    """Campos pedidos em `fields=` (todos se vazio); id sempre incluido"""
+    fields = list(LIST_COLUMNS)
+    if value:
+        fields = [f.strip() for f in value.split(',') if f.strip()]
+        unknown = [f for f in fields if f not in LIST_COLUMNS]
+        if unknown:
+            raise ValueError(f'Campo(s) invalido(s): {", ".join(unknown)}')
+        if 'id' not in fields:
+            fields.insert(0, 'id')
+    return fields
+
+
+def parse_list_query(query_string):
+    """Le limit, cursor e fields da query string de GET /api/lists
+    
+    Sem `limit` a listagem continua retornando todos os projetos.
+    """
+    query = urllib.parse.parse_qs(query_string)
+    
+    limit = None
+    if 'limit' in query:
+        try:
+            limit = int(query['limit'][0])
+        except ValueError:
+            raise ValueError('limit deve ser um numero')
+        if limit < 1 or limit > MAX_PAGE_SIZE:
+            raise ValueError(f'limit deve estar entre 1 e {MAX_PAGE_SIZE}')
+    
+    after = decode_cursor(query['cursor'][0]) if query.get('cursor') else None
+    fields = parse_fields(query.get('fields', [''])[0])
+    return limit, after, fields
+
+
+def parse_search_query(query_string):
+    """Le q, limit, offset e fields da query string de GET /api/lists/search
+    
+    Cada palavra de `q` vira um termo entre aspas com busca por prefixo
+    ("proj" encontra "projeto"); operadores e sintaxe do FTS5 enviados pelo
+    cliente nao sao interpretados.
+    """
+    query = urllib.parse.parse_qs(query_string)
+    
+    terms = SEARCH_TERM_RE.findall(query.get('q', [''])[0])[:SEARCH_MAX_TERMS]
+    if not terms:
+        raise ValueError('Informe o texto da busca em q')
+    match = ' '.join(f'"{term}"*' for term in terms)
+    
+    try:
+        limit = int(query.get('limit', [SEARCH_PAGE_SIZE])[0])
+        offset = int(query.get('offset', [0])[0])
+    except ValueError:
+        raise ValueError('limit e offset devem ser numeros')
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        raise ValueError(f'limit deve estar entre 1 e {MAX_PAGE_SIZE}')
+    if offset < 0:
+        raise ValueError('offset deve ser maior ou igual a zero')
+    
+    return match, limit, offset, parse_fields(query.get('fields', [''])[0])
+
+
+def parse_import_line(line):
+    """Valida uma linha NDJSON de POST /api/lists/import
+
+    Aplica as mesmas regras da criacao de projeto e retorna a tupla
+    (texto, description, priority, image_key, pinned); ValueError com a
+    mensagem do erro se a linha for invalida.
+    """
+    try:
+        data = json.loads(line)
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        raise ValueError('JSON invalido')
+    if not isinstance(data, dict):
+        raise ValueError('Cada linha deve ser um objeto JSON')
+
+    texto = data.get('texto') or ''
+    description = data.get('description') or ''
+    image_path = data.get('image_path') or ''
+    if not all(isinstance(v, str) for v in (texto, description, image_path)):
+        raise ValueError('texto, description e image_path devem ser texto')
+    texto = texto.strip()
+    description = description.strip()
+
+    if len(texto) < 3:
+        raise ValueError('Titulo deve ter pelo menos 3 caracteres')
+    if len(texto) > 500:
+        raise ValueError('Titulo não pode ter mais de 500 caracteres')
+    if len(description) > 1000:
+        raise ValueError('Descrição muito longa')
+
+    priority = data.get('priority', 'medium')
+    if priority not in ['low', 'medium', 'high']:
+        priority = 'medium'
+
+    if len(image_path) > 2700000:
+        raise ValueError('Imagem muito grande (max 2MB)')
+    image_key = image_store.key_from_input(image_path)
+
+    return texto, description, priority, image_key, 1 if data.get('pinned') else 0
+
+
+def parse_byte_range(header, size):
+    """Interpreta um header Range de intervalo unico
+    
+    Retorna None sem Range (ou em formato nao suportado), (inicio, fim)
+    inclusivo para um intervalo valido ou False se nao for satisfazivel.
+    """
+    if not header or not header.startswith('bytes=') or ',' in header:
+        return None
+    start, _, end = header[6:].strip().partition('-')
+    try:
+        if not start:
+            # bytes=-N: ultimos N bytes
+            length = int(end)
+            if length <= 0:
+                return False
+            return max(0, size - length), size - 1
+        start = int(start)
+        end = int(end) if end else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        return False
+    return start, min(end, size - 1)
+
 
 class ProjectHandler(http.server.SimpleHTTPRequestHandler):
+    # Conexoes persistentes: toda resposta precisa de Content-Length
+    protocol_version = 'HTTP/1.1'
+    # Headers e corpo saem em writes separados: com Nagle + delayed ACK cada
+    # resposta numa conexao reaproveitada esperaria ~40ms
+    disable_nagle_algorithm = True
+    
     def __init__(self, *args, **kwargs):
         super().__init__(*args, directory=".", **kwargs)
     
+    def setup(self):
+        # Timeout do socket = tempo maximo ocioso entre requisicoes
+        self.timeout = getattr(self.server, 'keepalive_timeout', KEEPALIVE_TIMEOUT)
+        self.max_requests = getattr(self.server, 'keepalive_requests', KEEPALIVE_MAX_REQUESTS)
+        self.requests_handled = 0
+        super().setup()
+        self.wfile = CountingWriter(self.wfile)
+    
+    def parse_request(self):
+        # Inicio da requisicao para as metricas (depois da espera keep-alive)
+        self.request_started = time.perf_counter()
+        self.status_code = None
+        self.wfile.count = 0
+        sql_timer.seconds = 0.0
+        # Bytes do corpo ainda nao lidos (-1 = tamanho desconhecido)
+        self.body_pending = 0
+        if not super().parse_request():
+            return False
+        if 'Transfer-Encoding' in self.headers:
+            self.body_pending = -1
+        else:
+            try:
+                self.body_pending = max(0, int(self.headers.get('Content-Length') or 0))
+            except ValueError:
+                self.body_pending = -1
+        self.body_size = max(0, self.body_pending)
+        path = urllib.parse.urlparse(self.path).path
+        if self.body_pending > MAX_JSON_BODY and path not in STREAMING_BODY_PATHS:
+            # Recusado pelo Content-Length, antes de ler qualquer byte do corpo
+            self.close_connection = True
+            self.send_json_response({'error': 'Corpo da requisicao muito grande'}, 413)
+            return False
+        # Streams de eventos tem limite proprio (metade dos workers); /metrics
+        # continua respondendo para o monitoramento enxergar a sobrecarga
+        admission = getattr(self.server, 'admission', None)
+        if admission is not None and path not in (EVENTS_PATH, METRICS_PATH):
+            if not admission.acquire(blocking=False):
+                metrics.observe_shed('in_flight')
+                self.close_connection = True
+                self.send_json_response({'error': 'Servidor sobrecarregado, tente novamente'}, 503,
+                                        headers={'Retry-After': str(SHED_RETRY_AFTER)})
+                return False
+            self.admitted = admission
+        # Cliente lento nao prende o worker: cada leitura/escrita tem timeout
+        self.connection.settimeout(REQUEST_IO_TIMEOUT)
+        if path not in UNBOUNDED_PATHS and REQUEST_DEADLINE > 0:
+            request_deadline.at = time.monotonic() + REQUEST_DEADLINE
+        return True
+    
+    def handle_one_request(self):
+        self.body_pending = 0
+        self.body_size = 0
+        self.request_started = None
+        self.admitted = None
+        try:
+            super().handle_one_request()
+        finally:
+            request_deadline.at = None
+            if self.admitted is not None:
+                self.admitted.release()
+            if self.request_started is not None:
+                self.record_metrics()
+        # De volta ao timeout ocioso do keep-alive
+        try:
+            self.connection.settimeout(self.timeout)
+        except OSError:
+            self.close_connection = True
+        self.requests_handled += 1
+        if self.requests_handled >= self.max_requests or getattr(self.server, 'draining', False):
+            self.close_connection = True
+        elif self.body_pending and not self.close_connection:
+            # Corpo ignorado (ex.: 401 antes de get_request_data) deixaria lixo no socket
+            try:
+                self.rfile.read(self.body_pending)
+            except OSError:
+                self.close_connection = True
+    
+    def record_metrics(self):
+        """Registra a requisicao que acabou de ser atendida"""
+        path = urllib.parse.urlparse(self.path).path if getattr(self, 'path', None) else ''
+        method = self.command if self.command in ('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS') else 'OTHER'
+        metrics.observe_request(
+            method, route_label(path), str(self.status_code or 'error'),
+            time.perf_counter() - self.request_started, sql_timer.seconds,
+            self.body_size, self.wfile.count
+        )
+    
+    def send_response(self, code, message=None):
+        self.status_code = code
+        super().send_response(code, message)
+        if (self.requests_handled + 1 >= self.max_requests
+                or not 0 <= self.body_pending <= KEEPALIVE_DRAIN_LIMIT
+                or getattr(self.server, 'draining', False)):
+            self.send_header('Connection', 'close')
+    
+    def log_error(self, format, *args):
+        # Conexao keep-alive ociosa expirando e o caso normal, nao um erro
+        if format.startswith('Request timed out'):
+            return
+        super().log_error(format, *args)
+    
+    def log_message(self, format, *args):
+        # Log de acesso pelo logger com buffer (o padrao escreve direto no stderr)
+        logger.info('%s - %s', self.address_string(), TOKEN_QUERY_RE.sub(r'\1***', format % args))
+    
     def send_cors_headers(self):
         """Envia headers CORS"""
         # CORS específico para localhost (mais seguro que *)
@@ -40,14 +1904,16 @@ class ProjectHandler(http.server.SimpleHTTPRequestHandler):
             self.send_header('Access-Control-Allow-Origin', origin)
         else:
             self.send_header('Access-Control-Allow-Origin', f'http://localhost:{PORT}')
-        self.send_header('Access-Control-Allow-Methods', 'GET, POST, PUT, DELETE, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization')
+        self.send_header('Access-Control-Allow-Methods', 'GET, POST, PUT, PATCH, DELETE, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization, If-None-Match')
+        self.send_header('Access-Control-Expose-Headers', 'ETag')
         self.send_header('Access-Control-Allow-Credentials', 'true')
     
     def do_OPTIONS(self):
         """Handle CORS preflight"""
         self.send_response(200)
         self.send_cors_headers()
+        self.send_header('Content-Length', '0')
         self.end_headers()
     
     def get_request_data(self):
@@ -56,35 +1922,50 @@ class ProjectHandler(http.server.SimpleHTTPRequestHandler):
             content_length = int(self.headers.get('Content-Length', 0))
             if content_length > 0:
                 post_data = self.rfile.read(content_length)
+                self.body_pending = 0
                 return json.loads(post_data.decode('utf-8'))
             return {}
         except (json.JSONDecodeError, ValueError, UnicodeDecodeError):
             return {}
     
-    def send_json_response(self, data, status=200):
+    def send_internal_error(self, error, **extra):
+        """500 padrao, ou 503 quando o SQLite foi interrompido pelo prazo da requisicao"""
+        if isinstance(error, sqlite3.OperationalError) and deadline_expired():
+            metrics.observe_shed('deadline')
+            self.send_json_response({'error': 'Tempo limite da requisicao excedido', **extra}, 503,
+                                    headers={'Retry-After': str(SHED_RETRY_AFTER)})
+            return
+        self.send_json_response({'error': f'Erro interno: {str(error)}', **extra}, 500)
+    
+    def send_busy_response(self):
+        """503 quando a fila de hashing de senhas esta cheia"""
+        self.send_json_response({'error': 'Servidor ocupado, tente novamente'}, 503, headers={'Retry-After': '1'})
+    
+    def send_json_response(self, data, status=200, headers=None):
         """Envia resposta JSON"""
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
         self.send_response(status)
         self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
         self.send_cors_headers()
         self.end_headers()
-        self.wfile.write(json.dumps(data, ensure_ascii=False).encode('utf-8'))
+        self.wfile.write(body)
     
-    def verify_token(self):
-        """Verifica token JWT"""
+    def bearer_token(self):
+        """Token do header Authorization (ou None)"""
         auth_header = self.headers.get('Authorization')
         if not auth_header or not auth_header.startswith('Bearer '):
             return None
-        
-        token = auth_header.split(' ')[1]
-        try:
-            payload = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
-            return payload.get('user_id')
-        except (jwt.InvalidTokenError, jwt.DecodeError, jwt.ExpiredSignatureError):
-            return None
+        return auth_header.split(' ')[1]
     
-    def hash_password(self, password):
-        """Criptografa senha"""
-        return hashlib.sha256(password.encode()).hexdigest()
+    def verify_token(self):
+        """Verifica token JWT"""
+        token = self.bearer_token()
+        if not token:
+            return None
+        return token_cache.verify(token)
     
     def do_POST(self):
         """Handle POST requests"""
@@ -94,8 +1975,17 @@ class ProjectHandler(http.server.SimpleHTTPRequestHandler):
             self.handle_register()
         elif path == '/api/login':
             self.handle_login()
+        elif path == '/api/logout':
+            self.handle_logout()
         elif path == '/api/lists':
             self.handle_create_project()
+        elif path == '/api/lists/import':
+            self.handle_import_projects()
+        elif path == IMAGES_URL_PREFIX.rstrip('/'):
+            self.handle_upload_image()
+        elif path.startswith('/api/lists/') and path.endswith('/move'):
+            project_id = path.split('/')[-2]
+            self.handle_move_project(project_id)
         else:
             self.send_json_response({'error': 'Endpoint nao encontrado'}, 404)
     
@@ -105,14 +1995,73 @@ class ProjectHandler(http.server.SimpleHTTPRequestHandler):
         
         if path == '/api/lists':
             self.handle_get_projects()
+        elif path == '/api/lists/search':
+            self.handle_search_projects()
+        elif path == '/api/lists/export':
+            self.handle_export_projects()
+        elif path == EVENTS_PATH:
+            self.handle_change_stream()
         elif path.startswith('/api/cep/'):
             cep = path.split('/')[-1]
             self.handle_get_cep(cep)
         elif path == '/api/quotes':
             self.handle_get_quotes()
-        else:
+        elif path == '/api/stats':
+            self.handle_get_stats()
+        elif path.startswith(IMAGES_URL_PREFIX):
+            self.handle_get_image(path[len(IMAGES_URL_PREFIX):])
+        elif path == METRICS_PATH:
+            self.handle_metrics()
+        elif not self.serve_static(path):
             super().do_GET()
     
+    def do_HEAD(self):
+        """Handle HEAD requests"""
+        path = urllib.parse.urlparse(self.path).path
+        if not self.serve_static(path, head=True):
+            super().do_HEAD()
+    
+    def serve_static(self, path, head=False):
+        """Serve arquivo estatico do cache em memoria; False se nao for cacheavel"""
+        if path.endswith('/'):
+            path += 'index.html'
+        if not path.endswith(STATIC_EXTENSIONS):
+            return False
+        
+        built = build_manifest.resolve(path)
+        fs_path, immutable = built if built else (self.translate_path(path), False)
+        asset = static_cache.get(fs_path)
+        if asset is None:
+            return False
+        # Nome com hash: o conteudo nunca muda. Sem hash o navegador sempre revalida (304 e barato)
+        cache_control = IMMUTABLE_CACHE_CONTROL if immutable else 'no-cache'
+        
+        encoding = asset.choose(self.headers.get('Accept-Encoding'))
+        body, etag = asset.variants[encoding]
+        
+        if_none_match = [t.strip() for t in self.headers.get('If-None-Match', '').split(',')]
+        if any(t in if_none_match for t in asset.etags()):
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', cache_control)
+            self.send_header('Vary', 'Accept-Encoding')
+            self.end_headers()
+            return True
+        
+        self.send_response(200)
+        self.send_header('Content-Type', asset.content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if encoding != 'identity':
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', asset.last_modified)
+        self.send_header('Cache-Control', cache_control)
+        self.send_header('Vary', 'Accept-Encoding')
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+        return True
+    
     def do_PUT(self):
         """Handle PUT requests"""
         path = urllib.parse.urlparse(self.path).path
@@ -125,6 +2074,16 @@ class ProjectHandler(http.server.SimpleHTTPRequestHandler):
         else:
             self.send_json_response({'error': 'Endpoint nao encontrado'}, 404)
     
+    def do_PATCH(self):
+        """Handle PATCH requests"""
+        path = urllib.parse.urlparse(self.path).path
+        
+        if path.startswith('/api/lists/') and path.count('/') == 3:
+            project_id = path.split('/')[-1]
+            self.handle_patch_project(project_id)
+        else:
+            self.send_json_response({'error': 'Endpoint nao encontrado'}, 404)
+    
     def do_DELETE(self):
         """Handle DELETE requests"""
         path = urllib.parse.urlparse(self.path).path
@@ -144,7 +2103,7 @@ class ProjectHandler(http.server.SimpleHTTPRequestHandler):
         username = data.get('username', '').strip()
         email = data.get('email', '').strip()
         password = data.get('password', '')
-        print(f"[DEBUG] /api/register recebido username={username} email={email} len(password)={len(password)}")
+        logger.debug('/api/register recebido username=%s email=%s len(password)=%d', username, email, len(password))
         
         if not username or not email or not password:
             self.send_json_response({'error': 'Dados obrigatorios faltando'}, 400)
@@ -166,30 +2125,41 @@ class ProjectHandler(http.server.SimpleHTTPRequestHandler):
             return
         
         try:
-            conn = sqlite3.connect(DB_NAME)
-            cursor = conn.cursor()
+            with db_pool.connection() as conn:
+                # Verifica se usuario ja existe
+                if conn.execute('SELECT id FROM users WHERE email = ? OR username = ?', (email, username)).fetchone():
+                    self.send_json_response({'error': 'Usuario ja existe'}, 400)
+                    return
             
-            # Verifica se usuario ja existe
-            cursor.execute('SELECT id FROM users WHERE email = ? OR username = ?', (email, username))
-            if cursor.fetchone():
-                self.send_json_response({'error': 'Usuario ja existe'}, 400)
+            # Hash fora da conexao: nao prende uma conexao do pool enquanto espera
+            try:
+                hashed_password = password_hasher.hash(password)
+            except PasswordHasherBusy:
+                self.send_busy_response()
                 return
             
-            # Cadastra usuario
-            hashed_password = self.hash_password(password)
-            cursor.execute(
-                'INSERT INTO users (username, email, password) VALUES (?, ?, ?)',
-                (username, email, hashed_password)
-            )
-            user_id = cursor.lastrowid
-            conn.commit()
-            conn.close()
+            with db_pool.connection() as conn:
+                cursor = conn.cursor()
+                try:
+                    cursor.execute(
+                        'INSERT INTO users (username, email, password) VALUES (?, ?, ?)',
+                        (username, email, hashed_password)
+                    )
+                except sqlite3.IntegrityError:
+                    # Cadastro simultaneo com o mesmo email/username
+                    self.send_json_response({'error': 'Usuario ja existe'}, 400)
+                    return
+                user_id = cursor.lastrowid
+                conn.commit()
             
             # Gera token
             token = jwt.encode({
                 'user_id': user_id,
                 'username': username,
-                'exp': datetime.now(timezone.utc) + timedelta(days=7)
+                'iat': datetime.now(timezone.utc),
+                # Dois logins no mesmo segundo gerariam o mesmo token (e o mesmo logout)
+                'jti': os.urandom(8).hex(),
+                'exp': datetime.now(timezone.utc) + timedelta(seconds=TOKEN_MAX_AGE)
             }, SECRET_KEY, algorithm='HS256')
             
             self.send_json_response({
@@ -197,27 +2167,19 @@ class ProjectHandler(http.server.SimpleHTTPRequestHandler):
                 'token': token,
                 'user': {'id': user_id, 'username': username, 'email': email}
             })
-            print(f"[DEBUG] /api/register sucesso id={user_id}")
+            logger.debug('/api/register sucesso id=%s', user_id)
             
         except Exception as e:
-            print(f"[DEBUG] /api/register erro: {e}")
-            self.send_json_response({'error': f'Erro interno: {str(e)}'}, 500)
+            logger.error('/api/register erro: %s', e)
+            self.send_internal_error(e)
     
     def handle_login(self):
         """Login de usuario"""
         # Rate limiting por IP
         client_ip = self.client_address[0]
-        current_time = datetime.now().timestamp()
-        
-        # Limpar tentativas antigas
-        if client_ip in login_attempts:
-            login_attempts[client_ip] = [
-                t for t in login_attempts[client_ip] 
-                if current_time - t < LOCKOUT_TIME
-            ]
         
         # Verificar se excedeu tentativas
-        if client_ip in login_attempts and len(login_attempts[client_ip]) >= MAX_LOGIN_ATTEMPTS:
+        if login_limiter.blocked(client_ip):
             self.send_json_response({
                 'error': f'Muitas tentativas de login. Tente novamente em {LOCKOUT_TIME//60} minutos.'
             }, 429)
@@ -226,42 +2188,53 @@ class ProjectHandler(http.server.SimpleHTTPRequestHandler):
         data = self.get_request_data()
         email = data.get('email', '').strip()
         password = data.get('password', '')
-        print(f"[DEBUG] /api/login recebido email={email} len(password)={len(password)}")
+        logger.debug('/api/login recebido email=%s len(password)=%d', email, len(password))
         
         if not email or not password:
             self.send_json_response({'error': 'Email e senha obrigatorios'}, 400)
             return
         
         try:
-            conn = sqlite3.connect(DB_NAME)
-            cursor = conn.cursor()
+            with db_pool.connection() as conn:
+                user = conn.execute(
+                    'SELECT id, username, email, password FROM users WHERE email = ?', (email,)
+                ).fetchone()
             
-            hashed_password = self.hash_password(password)
-            cursor.execute(
-                'SELECT id, username, email FROM users WHERE email = ? AND password = ?',
-                (email, hashed_password)
-            )
-            user = cursor.fetchone()
-            conn.close()
+            if user:
+                try:
+                    valid, new_hash = password_hasher.check(password, user[3])
+                except PasswordHasherBusy:
+                    self.send_busy_response()
+                    return
+                if not valid:
+                    user = None
+                elif new_hash:
+                    # Hash legado (SHA-256) ou parametros antigos: regrava com o atual
+                    with db_pool.connection() as conn:
+                        conn.execute(
+                            'UPDATE users SET password = ? WHERE id = ? AND password = ?',
+                            (new_hash, user[0], user[3])
+                        )
+                        conn.commit()
             
             if not user:
-                print(f"[DEBUG] /api/login falha: usuario nao encontrado")
+                logger.debug('/api/login falha: usuario nao encontrado')
                 # Registrar tentativa falhada
-                if client_ip not in login_attempts:
-                    login_attempts[client_ip] = []
-                login_attempts[client_ip].append(current_time)
+                login_limiter.record_failure(client_ip)
                 self.send_json_response({'error': 'Email ou senha incorretos'}, 401)
                 return
             
             # Limpar tentativas de login em caso de sucesso
-            if client_ip in login_attempts:
-                del login_attempts[client_ip]
+            login_limiter.reset(client_ip)
             
             # Gera token
             token = jwt.encode({
                 'user_id': user[0],
                 'username': user[1],
-                'exp': datetime.now(timezone.utc) + timedelta(days=7)
+                'iat': datetime.now(timezone.utc),
+                # Dois logins no mesmo segundo gerariam o mesmo token (e o mesmo logout)
+                'jti': os.urandom(8).hex(),
+                'exp': datetime.now(timezone.utc) + timedelta(seconds=TOKEN_MAX_AGE)
             }, SECRET_KEY, algorithm='HS256')
             
             self.send_json_response({
@@ -269,11 +2242,19 @@ class ProjectHandler(http.server.SimpleHTTPRequestHandler):
                 'token': token,
                 'user': {'id': user[0], 'username': user[1], 'email': user[2]}
             })
-            print(f"[DEBUG] /api/login sucesso user_id={user[0]}")
+            logger.debug('/api/login sucesso user_id=%s', user[0])
             
         except Exception as e:
-            print(f"[DEBUG] /api/login erro: {e}")
-            self.send_json_response({'error': f'Erro interno: {str(e)}'}, 500)
+            logger.error('/api/login erro: %s', e)
+            self.send_internal_error(e)
+    
+    def handle_logout(self):
+        """Revoga o token usado na requisicao"""
+        token = self.bearer_token()
+        if not token or not token_cache.revoke(token):
+            self.send_json_response({'error': 'Token invalido'}, 401)
+            return
+        self.send_json_response({'success': True})
     
     def handle_create_project(self):
         """Criar projeto"""
@@ -312,66 +2293,403 @@ class ProjectHandler(http.server.SimpleHTTPRequestHandler):
             return
         
         try:
-            conn = sqlite3.connect(DB_NAME)
-            cursor = conn.cursor()
-            
-            # Pega proximo order_index
-            cursor.execute('SELECT MAX(order_index) FROM projects WHERE user_id = ?', (user_id,))
-            max_order = cursor.fetchone()[0] or 0
-            
-            cursor.execute('''
-                INSERT INTO projects (user_id, texto, description, priority, image_path, pinned, order_index) 
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (user_id, texto, description, priority, image_path, pinned, max_order + 1))
-            
-            project_id = cursor.lastrowid
-            conn.commit()
-            conn.close()
+            image_key = image_store.key_from_input(image_path)
+        except ValueError as e:
+            self.send_json_response({'error': str(e)}, 400)
+            return
+        
+        try:
+            with project_shards.connection(user_id) as conn:
+                cursor = conn.cursor()
+                
+                # Pega proximo order_index
+                cursor.execute('SELECT MAX(order_index) FROM projects WHERE user_id = ?', (user_id,))
+                max_order = cursor.fetchone()[0] or 0
+                
+                cursor.execute('''
+                    INSERT INTO projects (user_id, texto, description, priority, image_key, pinned, order_index) 
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', (user_id, texto, description, priority, image_key, pinned, max_order + 1))
+                
+                project_id = cursor.lastrowid
+                bump_projects_version(conn, user_id)
+                item = project_item(conn, project_id)
+                conn.commit()
             
+            change_hub.publish(user_id, {'type': 'created', 'item': item})
             self.send_json_response({
                 'success': True,
                 'id': project_id,
+                'image_path': image_url(image_key),
                 'message': 'Projeto criado com sucesso'
             })
             
         except Exception as e:
-            self.send_json_response({'error': f'Erro interno: {str(e)}'}, 500)
+            self.send_internal_error(e)
     
     def handle_get_projects(self):
-        """Listar projetos"""
+        """Listar projetos (paginacao por cursor e projecao de campos opcionais)"""
+        user_id = self.verify_token()
+        if not user_id:
+            self.send_json_response({'error': 'Token invalido'}, 401)
+            return
+        
+        query_string = urllib.parse.urlparse(self.path).query
+        try:
+            limit, after, fields = parse_list_query(query_string)
+        except ValueError as e:
+            self.send_json_response({'error': str(e)}, 400)
+            return
+        
+        # pinned, order_index e id sempre vem primeiro: formam a chave do cursor
+        extra_fields = [f for f in fields if f not in ('id', 'pinned', 'order_index')]
+        columns = ', '.join(['pinned', 'order_index', 'id'] + [LIST_COLUMNS[f] for f in extra_fields])
+        select = f'SELECT {columns} FROM projects WHERE user_id = ?'
+        order = 'ORDER BY pinned DESC, order_index ASC, id ASC'
+        fetch = limit + 1 if limit else -1  # LIMIT -1 = sem limite
+        
+        try:
+            with project_shards.connection(user_id) as conn:
+                cursor = conn.cursor()
+                # Versao e projetos lidos no mesmo snapshot
+                cursor.execute('BEGIN')
+                cursor.execute('SELECT version FROM project_versions WHERE user_id = ?', (user_id,))
+                row = cursor.fetchone()
+                etag = list_etag(user_id, row[0] if row else 0, query_string)
+                
+                # Nada mudou desde a ultima resposta do cliente: 304 sem consultar projects
+                if etag in [t.strip() for t in self.headers.get('If-None-Match', '').split(',')]:
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.send_header('Cache-Control', 'private, no-cache')
+                    self.send_cors_headers()
+                    self.end_headers()
+                    return
+                
+                if after:
+                    # Keyset em duas etapas (resto do grupo atual de pinned e
+                    # depois os grupos seguintes): cada uma usa o indice direto
+                    pinned, order_index, last_id = after
+                    cursor.execute(
+                        f'{select} AND pinned = ? AND (order_index, id) > (?, ?) {order} LIMIT ?',
+                        (user_id, pinned, order_index, last_id, fetch)
+                    )
+                    rows = cursor.fetchall()
+                    if fetch == -1 or len(rows) < fetch:
+                        cursor.execute(
+                            f'{select} AND pinned < ? {order} LIMIT ?',
+                            (user_id, pinned, fetch if fetch == -1 else fetch - len(rows))
+                        )
+                        rows += cursor.fetchall()
+                else:
+                    cursor.execute(f'{select} {order} LIMIT ?', (user_id, fetch))
+                    rows = cursor.fetchall()
+            
+            next_cursor = None
+            if limit and len(rows) > limit:
+                rows = rows[:limit]
+                last = rows[-1]
+                next_cursor = encode_cursor(last[0], last[1], last[2])
+            
+            projects = []
+            for row in rows:
+                values = dict(zip(extra_fields, row[3:]))
+                values.update({'id': row[2], 'pinned': row[0], 'order_index': row[1]})
+                item = {f: values[f] for f in fields}
+                if 'pinned' in item:
+                    item['pinned'] = bool(item['pinned'])
+                if 'image_path' in item:
+                    item['image_path'] = image_url(item['image_path'])
+                projects.append(item)
+            
+            self.send_json_response(
+                {'success': True, 'items': projects, 'next_cursor': next_cursor},
+                headers={'ETag': etag, 'Cache-Control': 'private, no-cache', 'Vary': 'Authorization'}
+            )
+            
+        except Exception as e:
+            self.send_internal_error(e)
+    
+    def handle_search_projects(self):
+        """Busca textual em texto e description (FTS5, ordenada por relevancia)"""
         user_id = self.verify_token()
         if not user_id:
             self.send_json_response({'error': 'Token invalido'}, 401)
             return
         
         try:
-            conn = sqlite3.connect(DB_NAME)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                SELECT id, texto, description, priority, image_path, pinned, order_index, created_at 
-                FROM projects WHERE user_id = ? ORDER BY pinned DESC, order_index ASC
-            ''', (user_id,))
-            
-            projects = []
-            for row in cursor.fetchall():
-                projects.append({
-                    'id': row[0],
-                    'texto': row[1],
-                    'description': row[2],
-                    'priority': row[3],
-                    'image_path': row[4],
-                    'pinned': bool(row[5]),
-                    'order_index': row[6],
-                    'created_at': row[7]
-                })
-            
-            conn.close()
-            self.send_json_response({'success': True, 'items': projects})
-            
-        except Exception as e:
-            self.send_json_response({'error': f'Erro interno: {str(e)}'}, 500)
-    
+            match, limit, offset, fields = parse_search_query(urllib.parse.urlparse(self.path).query)
+        except ValueError as e:
+            self.send_json_response({'error': str(e)}, 400)
+            return
+        
+        columns = ', '.join(f'p.{LIST_COLUMNS[f]}' for f in fields)
+        weights = ', '.join(str(w) for w in SEARCH_WEIGHTS)
+        try:
+            with project_shards.connection(user_id) as conn:
+                # O filtro por user_id dentro do MATCH deixa o FTS5 cruzar as
+                # listas de termos so com os projetos do usuario; a pagina e
+                # escolhida so no indice e apenas ela e buscada em projects
+                rows = conn.execute(f'''
+                    SELECT {columns} FROM (
+                        SELECT rowid, bm25(projects_fts, {weights}) AS score FROM projects_fts
+                        WHERE projects_fts MATCH ? ORDER BY score, rowid LIMIT ? OFFSET ?
+                    ) f JOIN projects p ON p.id = f.rowid
+                    WHERE p.user_id = ?
+                    ORDER BY f.score, p.id
+                ''', (f'user_id : "{user_id}" AND ({match})', limit + 1, offset, user_id)).fetchall()
+            
+            next_offset = offset + limit if len(rows) > limit else None
+            projects = []
+            for row in rows[:limit]:
+                item = dict(zip(fields, row))
+                if 'pinned' in item:
+                    item['pinned'] = bool(item['pinned'])
+                if 'image_path' in item:
+                    item['image_path'] = image_url(item['image_path'])
+                projects.append(item)
+            
+            self.send_json_response({'success': True, 'items': projects, 'next_offset': next_offset})
+
+        except Exception as e:
+            self.send_internal_error(e)
+
+    def handle_export_projects(self):
+        """Exporta todos os projetos do usuario em NDJSON, em streaming
+
+        As linhas saem do cursor direto para a resposta (chunked no HTTP/1.1),
+        entao a memoria usada nao depende do tamanho da lista.
+        """
+        user_id = self.verify_token()
+        if not user_id:
+            self.send_json_response({'error': 'Token invalido'}, 401)
+            return
+
+        fields = list(LIST_COLUMNS)
+        columns = ', '.join(LIST_COLUMNS[f] for f in fields)
+        chunked = self.request_version == 'HTTP/1.1'
+        started = False
+        try:
+            with project_shards.connection(user_id) as conn:
+                cursor = conn.cursor()
+                # Snapshot unico: alteracoes feitas durante o download nao aparecem pela metade
+                cursor.execute('BEGIN')
+                cursor.execute(
+                    f'SELECT {columns} FROM projects WHERE user_id = ? '
+                    'ORDER BY pinned DESC, order_index ASC, id ASC',
+                    (user_id,)
+                )
+
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/x-ndjson; charset=utf-8')
+                self.send_header('Content-Disposition', 'attachment; filename="projetos.ndjson"')
+                self.send_header('Cache-Control', 'no-store')
+                if chunked:
+                    self.send_header('Transfer-Encoding', 'chunked')
+                else:
+                    # HTTP/1.0: sem tamanho conhecido, o fim da resposta e o fim da conexao
+                    self.send_header('Connection', 'close')
+                    self.close_connection = True
+                self.send_cors_headers()
+                self.end_headers()
+                started = True
+
+                buffer = []
+                size = 0
+                for row in cursor:
+                    item = dict(zip(fields, row))
+                    item['pinned'] = bool(item['pinned'])
+                    item['image_path'] = image_url(item['image_path'])
+                    line = (json.dumps(item, ensure_ascii=False) + '\n').encode('utf-8')
+                    buffer.append(line)
+                    size += len(line)
+                    if size >= EXPORT_CHUNK_SIZE:
+                        self.write_chunk(b''.join(buffer), chunked)
+                        buffer = []
+                        size = 0
+                if buffer:
+                    self.write_chunk(b''.join(buffer), chunked)
+                if chunked:
+                    self.wfile.write(b'0\r\n\r\n')
+
+        except Exception as e:
+            if not started:
+                self.send_internal_error(e)
+                return
+            # Headers ja enviados: fechar sem o chunk final sinaliza resposta incompleta
+            logger.error('Exportacao interrompida (usuario %s): %s', user_id, e)
+            self.close_connection = True
+
+    def write_chunk(self, data, chunked):
+        """Escreve um pedaco do corpo (com o enquadramento chunked se for o caso)"""
+        if chunked:
+            self.wfile.write(b'%x\r\n' % len(data) + data + b'\r\n')
+        else:
+            self.wfile.write(data)
+
+    def handle_import_projects(self):
+        """Importa projetos enviados em NDJSON (um projeto por linha)
+
+        O corpo e lido linha a linha e os projetos validos sao gravados em
+        lotes de IMPORT_BATCH_SIZE por transacao; linhas invalidas sao puladas
+        e listadas em `errors` com o numero da linha.
+        """
+        user_id = self.verify_token()
+        if not user_id:
+            self.send_json_response({'error': 'Token invalido'}, 401)
+            return
+
+        remaining = self.body_pending
+        if 'Transfer-Encoding' in self.headers or 'Content-Length' not in self.headers or remaining < 0:
+            self.send_json_response({'error': 'Content-Length obrigatorio'}, 411)
+            return
+
+        imported = 0
+        failed = 0
+        errors = []
+        batch = []
+        line_number = 0
+        try:
+            while remaining > 0:
+                line = self.rfile.readline(min(remaining, IMPORT_MAX_LINE + 1))
+                if not line:
+                    # Cliente fechou antes de enviar o corpo inteiro
+                    self.close_connection = True
+                    break
+                remaining -= len(line)
+                self.body_pending = remaining
+                line_number += 1
+
+                try:
+                    if len(line) > IMPORT_MAX_LINE:
+                        # Descarta o resto da linha sem guardar em memoria
+                        while remaining > 0 and not line.endswith(b'\n'):
+                            line = self.rfile.readline(min(remaining, EXPORT_CHUNK_SIZE))
+                            if not line:
+                                break
+                            remaining -= len(line)
+                        self.body_pending = remaining
+                        raise ValueError('Linha muito longa')
+                    if line.strip():
+                        batch.append(parse_import_line(line))
+                except ValueError as e:
+                    failed += 1
+                    if len(errors) < IMPORT_MAX_ERRORS:
+                        errors.append({'line': line_number, 'error': str(e)})
+
+                if len(batch) >= IMPORT_BATCH_SIZE:
+                    imported += self.insert_projects(user_id, batch)
+                    batch = []
+
+            if batch:
+                imported += self.insert_projects(user_id, batch)
+
+        except Exception as e:
+            self.send_internal_error(e, imported=imported)
+            return
+
+        self.send_json_response({'success': True, 'imported': imported, 'failed': failed, 'errors': errors})
+
+    def insert_projects(self, user_id, rows):
+        """Grava um lote de projetos validados no fim da lista do usuario"""
+        with project_shards.connection(user_id) as conn:
+            # Lock de escrita antes de ler o MAX: outro lote/criacao nao pega o mesmo rank
+            conn.execute('BEGIN IMMEDIATE')
+            max_order = conn.execute(
+                'SELECT MAX(order_index) FROM projects WHERE user_id = ?', (user_id,)
+            ).fetchone()[0] or 0
+            conn.executemany('''
+                INSERT INTO projects (user_id, texto, description, priority, image_key, pinned, order_index)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', [(user_id, *row, max_order + i) for i, row in enumerate(rows, 1)])
+            bump_projects_version(conn, user_id)
+            conn.commit()
+        # Lote inteiro: o cliente recarrega a lista em vez de aplicar cada item
+        change_hub.publish(user_id, {'type': 'reload'})
+        return len(rows)
+
+    def handle_change_stream(self):
+        """Stream SSE com as alteracoes nos projetos do usuario
+
+        Cada evento `change` traz a alteracao ja aplicada no banco (created,
+        updated, deleted, moved, reordered, cleared ou reload). Com
+        Last-Event-ID o stream comeca pelos eventos perdidos; se eles ja nao
+        estiverem no historico o cliente recebe `reset` e recarrega a lista.
+        """
+        query = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+        # EventSource nao envia headers: o token tambem e aceito em ?token=
+        token = self.bearer_token() or query.get('token', [''])[0]
+        user_id = token_cache.verify(token) if token else None
+        if not user_id:
+            self.send_json_response({'error': 'Token invalido'}, 401)
+            return
+
+        # No prefork cada processo tem o seu hub e o stream veria so parte das
+        # alteracoes: 204 faz o EventSource parar de reconectar
+        if not getattr(self.server, 'change_events', True):
+            self.send_response(204)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        # Cada stream ocupa um worker ate fechar: no maximo metade do pool
+        # (no modo single nenhum, ou o servidor inteiro ficaria preso)
+        max_streams = getattr(self.server, 'workers', 0) // 2
+        last_event_id = self.headers.get('Last-Event-ID') or query.get('last_event_id', [''])[0]
+        subscriber, backlog, current_id = change_hub.subscribe(user_id, last_event_id, max_streams)
+        if subscriber is None:
+            self.send_json_response({'error': 'Muitos streams abertos, tente novamente'}, 503,
+                                    headers={'Retry-After': str(SSE_RETRY_MS // 1000)})
+            return
+
+        try:
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream; charset=utf-8')
+            self.send_header('Cache-Control', 'no-store')
+            # Sem tamanho: a resposta termina quando a conexao fecha
+            self.send_header('Connection', 'close')
+            self.close_connection = True
+            self.send_cors_headers()
+            self.end_headers()
+
+            self.wfile.write(f'retry: {SSE_RETRY_MS}\n\n'.encode('ascii'))
+            if backlog is None:
+                self.wfile.write(f'id: {current_id}\nevent: reset\ndata: {{}}\n\n'.encode('ascii'))
+            else:
+                for message in backlog:
+                    self.wfile.write(message)
+                self.wfile.write(f'id: {current_id}\nevent: ready\ndata: {{}}\n\n'.encode('ascii'))
+
+            last_write = time.monotonic()
+            while not getattr(self.server, 'draining', False):
+                try:
+                    message = subscriber.get(timeout=SSE_POLL_INTERVAL)
+                except queue.Empty:
+                    if self.client_gone():
+                        break
+                    if time.monotonic() - last_write < SSE_HEARTBEAT:
+                        continue
+                    # Token revogado (logout) ou expirado encerra o stream
+                    if token_cache.verify(token) != user_id:
+                        break
+                    message = b': ping\n\n'
+                if message is None:
+                    break
+                self.wfile.write(message)
+                last_write = time.monotonic()
+        except OSError:
+            pass  # cliente desconectou
+        finally:
+            change_hub.unsubscribe(user_id, subscriber)
+
+    def client_gone(self):
+        """True se o cliente fechou a conexao (para streams, em que ele nao envia mais nada)"""
+        try:
+            readable, _, _ = select.select([self.connection], [], [], 0)
+            return bool(readable) and not self.connection.recv(1, socket.MSG_PEEK)
+        except OSError:
+            return True
+
     def handle_update_project(self, project_id):
         """Atualizar projeto"""
         user_id = self.verify_token()
@@ -408,32 +2726,139 @@ class ProjectHandler(http.server.SimpleHTTPRequestHandler):
             return
         
         try:
-            conn = sqlite3.connect(DB_NAME)
-            cursor = conn.cursor()
+            image_key = image_store.key_from_input(image_path)
+        except ValueError as e:
+            self.send_json_response({'error': str(e)}, 400)
+            return
+        
+        try:
+            with project_shards.connection(user_id) as conn:
+                cursor = conn.cursor()
+                
+                # Atualizar com ou sem order_index
+                if order_index is not None:
+                    cursor.execute('''
+                        UPDATE projects SET texto = ?, description = ?, priority = ?, image_key = ?, pinned = ?, order_index = ?
+                        WHERE id = ? AND user_id = ?
+                    ''', (texto, description, priority, image_key, pinned, order_index, project_id, user_id))
+                else:
+                    cursor.execute('''
+                        UPDATE projects SET texto = ?, description = ?, priority = ?, image_key = ?, pinned = ?
+                        WHERE id = ? AND user_id = ?
+                    ''', (texto, description, priority, image_key, pinned, project_id, user_id))
+                
+                if cursor.rowcount == 0:
+                    self.send_json_response({'error': 'Projeto nao encontrado'}, 404)
+                    return
+                
+                bump_projects_version(conn, user_id)
+                item = project_item(conn, project_id)
+                conn.commit()
             
-            # Atualizar com ou sem order_index
-            if order_index is not None:
-                cursor.execute('''
-                    UPDATE projects SET texto = ?, description = ?, priority = ?, image_path = ?, pinned = ?, order_index = ?
-                    WHERE id = ? AND user_id = ?
-                ''', (texto, description, priority, image_path, pinned, order_index, project_id, user_id))
-            else:
-                cursor.execute('''
-                    UPDATE projects SET texto = ?, description = ?, priority = ?, image_path = ?, pinned = ?
-                    WHERE id = ? AND user_id = ?
-                ''', (texto, description, priority, image_path, pinned, project_id, user_id))
+            change_hub.publish(user_id, {'type': 'updated', 'item': item})
+            self.send_json_response({'success': True, 'message': 'Projeto atualizado'})
             
-            if cursor.rowcount == 0:
-                self.send_json_response({'error': 'Projeto nao encontrado'}, 404)
+        except Exception as e:
+            self.send_internal_error(e)
+    
+    def handle_patch_project(self, project_id):
+        """Atualizar parcialmente um projeto (so os campos enviados sao validados e gravados)"""
+        user_id = self.verify_token()
+        if not user_id:
+            self.send_json_response({'error': 'Token invalido'}, 401)
+            return
+        
+        data = self.get_request_data()
+        if not isinstance(data, dict) or not data:
+            self.send_json_response({'error': 'Nenhum campo para atualizar'}, 400)
+            return
+        
+        unknown = [field for field in data if field not in PATCH_FIELDS]
+        if unknown:
+            self.send_json_response({'error': f'Campo(s) invalido(s): {", ".join(unknown)}'}, 400)
+            return
+        
+        # Coluna -> valor, apenas para o que veio no corpo
+        updates = {}
+        
+        if 'texto' in data:
+            texto = data['texto'].strip() if isinstance(data['texto'], str) else ''
+            if len(texto) < 3:
+                self.send_json_response({'error': 'Titulo deve ter pelo menos 3 caracteres'}, 400)
                 return
+            if len(texto) > 500:
+                self.send_json_response({'error': 'Titulo muito longo'}, 400)
+                return
+            updates['texto'] = texto
+        
+        if 'description' in data:
+            description = data['description'] or ''
+            if not isinstance(description, str):
+                self.send_json_response({'error': 'Descrição invalida'}, 400)
+                return
+            description = description.strip()
+            if len(description) > 1000:
+                self.send_json_response({'error': 'Descrição muito longa'}, 400)
+                return
+            updates['description'] = description
+        
+        if 'priority' in data:
+            if data['priority'] not in ['low', 'medium', 'high']:
+                self.send_json_response({'error': 'Prioridade deve ser low, medium ou high'}, 400)
+                return
+            updates['priority'] = data['priority']
+        
+        if 'pinned' in data:
+            updates['pinned'] = 1 if data['pinned'] else 0
+        
+        if 'order_index' in data:
+            order_index = data['order_index']
+            if isinstance(order_index, bool) or not isinstance(order_index, (int, float)):
+                self.send_json_response({'error': 'order_index deve ser numerico'}, 400)
+                return
+            updates['order_index'] = order_index
+        
+        if 'image_path' in data:
+            image_path = data['image_path'] or ''
+            if not isinstance(image_path, str):
+                self.send_json_response({'error': 'Formato de imagem invalido'}, 400)
+                return
+            if len(image_path) > 2700000:
+                self.send_json_response({'error': 'Imagem muito grande'}, 400)
+                return
+            try:
+                updates['image_key'] = image_store.key_from_input(image_path)
+            except ValueError as e:
+                self.send_json_response({'error': str(e)}, 400)
+                return
+        
+        # Nomes de coluna vem da lista fixa acima, nunca do cliente
+        assignments = ', '.join(f'{column} = ?' for column in updates)
+        
+        try:
+            with project_shards.connection(user_id) as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    f'UPDATE projects SET {assignments} WHERE id = ? AND user_id = ?',
+                    (*updates.values(), project_id, user_id)
+                )
+                
+                if cursor.rowcount == 0:
+                    self.send_json_response({'error': 'Projeto nao encontrado'}, 404)
+                    return
+                
+                bump_projects_version(conn, user_id)
+                item = project_item(conn, project_id)
+                conn.commit()
             
-            conn.commit()
-            conn.close()
-            
-            self.send_json_response({'success': True, 'message': 'Projeto atualizado'})
+            change_hub.publish(user_id, {'type': 'updated', 'item': item})
+            response = {'success': True, 'message': 'Projeto atualizado'}
+            if 'image_key' in updates:
+                response['image_path'] = image_url(updates['image_key'])
+            self.send_json_response(response)
             
         except Exception as e:
-            self.send_json_response({'error': f'Erro interno: {str(e)}'}, 500)
+            self.send_internal_error(e)
     
     def handle_delete_project(self, project_id):
         """Deletar projeto"""
@@ -443,22 +2868,24 @@ class ProjectHandler(http.server.SimpleHTTPRequestHandler):
             return
         
         try:
-            conn = sqlite3.connect(DB_NAME)
-            cursor = conn.cursor()
-            
-            cursor.execute('DELETE FROM projects WHERE id = ? AND user_id = ?', (project_id, user_id))
-            
-            if cursor.rowcount == 0:
-                self.send_json_response({'error': 'Projeto nao encontrado'}, 404)
-                return
-            
-            conn.commit()
-            conn.close()
+            with project_shards.connection(user_id) as conn:
+                cursor = conn.cursor()
+                
+                cursor.execute('DELETE FROM projects WHERE id = ? AND user_id = ? RETURNING id', (project_id, user_id))
+                deleted = cursor.fetchall()
+                
+                if not deleted:
+                    self.send_json_response({'error': 'Projeto nao encontrado'}, 404)
+                    return
+                
+                bump_projects_version(conn, user_id)
+                conn.commit()
             
+            change_hub.publish(user_id, {'type': 'deleted', 'id': deleted[0][0]})
             self.send_json_response({'success': True, 'message': 'Projeto deletado'})
             
         except Exception as e:
-            self.send_json_response({'error': f'Erro interno: {str(e)}'}, 500)
+            self.send_internal_error(e)
     
     def handle_delete_all_projects(self):
         """Deletar todos os projetos do usuário"""
@@ -468,22 +2895,23 @@ class ProjectHandler(http.server.SimpleHTTPRequestHandler):
             return
         
         try:
-            conn = sqlite3.connect(DB_NAME)
-            cursor = conn.cursor()
-            
-            cursor.execute('DELETE FROM projects WHERE user_id = ?', (user_id,))
-            deleted_count = cursor.rowcount
-            
-            conn.commit()
-            conn.close()
+            with project_shards.connection(user_id) as conn:
+                cursor = conn.cursor()
+                
+                cursor.execute('DELETE FROM projects WHERE user_id = ?', (user_id,))
+                deleted_count = cursor.rowcount
+                
+                bump_projects_version(conn, user_id)
+                conn.commit()
             
+            change_hub.publish(user_id, {'type': 'cleared'})
             self.send_json_response({
                 'success': True, 
                 'message': f'{deleted_count} projeto(s) deletado(s)'
             })
             
         except Exception as e:
-            self.send_json_response({'error': f'Erro interno: {str(e)}'}, 500)
+            self.send_internal_error(e)
     
     def handle_reorder_projects(self):
         """Reordenar projetos"""
@@ -496,22 +2924,209 @@ class ProjectHandler(http.server.SimpleHTTPRequestHandler):
         order = data.get('order', [])
         
         try:
-            conn = sqlite3.connect(DB_NAME)
-            cursor = conn.cursor()
+            with project_shards.connection(user_id) as conn:
+                cursor = conn.cursor()
+                
+                cursor.executemany(
+                    'UPDATE projects SET order_index = ? WHERE id = ? AND user_id = ?',
+                    ((index, project_id, user_id) for index, project_id in enumerate(order))
+                )
+                
+                bump_projects_version(conn, user_id)
+                conn.commit()
             
-            for index, project_id in enumerate(order):
+            change_hub.publish(user_id, {'type': 'reordered', 'order': order})
+            self.send_json_response({'success': True, 'message': 'Ordem atualizada'})
+            
+        except Exception as e:
+            self.send_internal_error(e)
+    
+    def handle_move_project(self, project_id):
+        """Mover projeto para entre dois vizinhos (after = item acima, before = item abaixo)
+        
+        Apenas a linha movida e alterada: recebe um order_index fracionario
+        entre os ranks dos vizinhos.
+        """
+        user_id = self.verify_token()
+        if not user_id:
+            self.send_json_response({'error': 'Token invalido'}, 401)
+            return
+        
+        data = self.get_request_data()
+        after_id = data.get('after')
+        before_id = data.get('before')
+        
+        if after_id is None and before_id is None:
+            self.send_json_response({'error': 'Informe after e/ou before'}, 400)
+            return
+        
+        if str(project_id) in (str(after_id), str(before_id)):
+            self.send_json_response({'error': 'Um projeto nao pode ser vizinho de si mesmo'}, 400)
+            return
+        
+        try:
+            with project_shards.connection(user_id) as conn:
+                cursor = conn.cursor()
+                # Lock de escrita antes de ler os ranks: evita calcular o meio
+                # a partir de valores que outro worker esta renumerando
+                cursor.execute('BEGIN IMMEDIATE')
+                
+                def rank_of(item_id):
+                    cursor.execute(
+                        'SELECT pinned, order_index, id FROM projects WHERE id = ? AND user_id = ?',
+                        (item_id, user_id)
+                    )
+                    return cursor.fetchone()
+                
+                def neighbour_bounds():
+                    lo = rank_of(after_id) if after_id is not None else None
+                    hi = rank_of(before_id) if before_id is not None else None
+                    return lo, hi
+                
+                moved = rank_of(project_id)
+                lo, hi = neighbour_bounds()
+                if not moved or (after_id is not None and not lo) or (before_id is not None and not hi):
+                    self.send_json_response({'error': 'Projeto nao encontrado'}, 404)
+                    return
+                
+                pinned = moved[0]
+                if any(bound and bound[0] != pinned for bound in (lo, hi)):
+                    self.send_json_response({'error': 'Nao e possivel mover entre fixados e nao fixados'}, 400)
+                    return
+                
+                def new_rank(lo, hi):
+                    if lo is None:
+                        return hi[1] - 1
+                    if hi is None:
+                        return lo[1] + 1
+                    return (lo[1] + hi[1]) / 2
+                
+                rank = new_rank(lo, hi)
+                if lo and hi and not lo[1] < rank < hi[1]:
+                    if lo[1] > hi[1]:
+                        self.send_json_response({'error': 'Vizinhos fora de ordem'}, 400)
+                        return
+                    # Ranks iguais ou precisao esgotada: renumera agora e recalcula
+                    rebalance_ranks(conn, user_id)
+                    lo, hi = neighbour_bounds()
+                    rank = new_rank(lo, hi)
+                
                 cursor.execute(
                     'UPDATE projects SET order_index = ? WHERE id = ? AND user_id = ?',
-                    (index, project_id, user_id)
+                    (rank, project_id, user_id)
                 )
+                bump_projects_version(conn, user_id)
+                conn.commit()
             
-            conn.commit()
-            conn.close()
+            if lo and hi and hi[1] - lo[1] < RANK_REBALANCE_GAP:
+                rank_rebalancer.schedule(user_id)
             
-            self.send_json_response({'success': True, 'message': 'Ordem atualizada'})
+            change_hub.publish(user_id, {
+                'type': 'moved', 'id': moved[2], 'after': lo and lo[2], 'before': hi and hi[2], 'order_index': rank
+            })
+            self.send_json_response({'success': True, 'order_index': rank})
             
         except Exception as e:
-            self.send_json_response({'error': f'Erro interno: {str(e)}'}, 500)
+            self.send_internal_error(e)
+    
+    def handle_upload_image(self):
+        """Upload binario de imagem: corpo = bytes da imagem, Content-Type = tipo
+        
+        O corpo vai do socket para o disco em blocos de IMAGE_CHUNK_SIZE; a
+        resposta traz a URL para usar em image_path ao criar/editar projetos.
+        """
+        user_id = self.verify_token()
+        if not user_id:
+            self.send_json_response({'error': 'Token invalido'}, 401)
+            return
+        
+        if 'Transfer-Encoding' in self.headers or 'Content-Length' not in self.headers or self.body_pending < 0:
+            self.send_json_response({'error': 'Content-Length obrigatorio'}, 411)
+            return
+        
+        length = self.body_pending
+        content_type = (self.headers.get('Content-Type') or '').split(';')[0].strip().lower()
+        try:
+            key = image_store.put_stream(self.rfile, length, content_type)
+        except ValueError as e:
+            # Parte do corpo pode ja ter sido lida: a conexao nao e reaproveitada
+            self.body_pending = -1
+            self.close_connection = True
+            self.send_json_response({'error': str(e)}, 413 if length > MAX_IMAGE_BYTES else 400)
+            return
+        except (ConnectionError, TimeoutError) as e:
+            logger.warning('upload de imagem interrompido: %s', e)
+            self.close_connection = True
+            return
+        except Exception as e:
+            self.body_pending = -1
+            self.close_connection = True
+            self.send_internal_error(e)
+            return
+        
+        self.body_pending = 0
+        self.send_json_response({'success': True, 'image_path': image_url(key)})
+    
+    def handle_get_image(self, key):
+        """Servir imagem do armazenamento (cache longo, ETag e Range)"""
+        if not IMAGE_KEY_RE.match(key):
+            self.send_json_response({'error': 'Imagem nao encontrada'}, 404)
+            return
+        
+        try:
+            f = open(image_store.path_for(key), 'rb')
+        except OSError:
+            self.send_json_response({'error': 'Imagem nao encontrada'}, 404)
+            return
+        
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            # A chave e o hash do conteudo: o ETag nunca muda para a mesma URL
+            etag = f'"{key.split(".")[0]}"'
+            
+            if_none_match = self.headers.get('If-None-Match', '')
+            if if_none_match.strip() == '*' or etag in [t.strip() for t in if_none_match.split(',')]:
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.send_header('Cache-Control', IMMUTABLE_CACHE_CONTROL)
+                self.send_cors_headers()
+                self.end_headers()
+                return
+            
+            byte_range = None
+            if_range = self.headers.get('If-Range')
+            if not if_range or if_range.strip() == etag:
+                byte_range = parse_byte_range(self.headers.get('Range'), size)
+            
+            if byte_range is False:
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{size}')
+                self.send_header('Content-Length', '0')
+                self.send_cors_headers()
+                self.end_headers()
+                return
+            
+            start, end = byte_range if byte_range else (0, size - 1)
+            length = end - start + 1
+            
+            self.send_response(206 if byte_range else 200)
+            self.send_header('Content-Type', mimetypes.guess_type(key)[0] or 'application/octet-stream')
+            self.send_header('Content-Length', str(length))
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', IMMUTABLE_CACHE_CONTROL)
+            self.send_header('Accept-Ranges', 'bytes')
+            if byte_range:
+                self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+            self.send_cors_headers()
+            self.end_headers()
+            
+            f.seek(start)
+            while length > 0:
+                chunk = f.read(min(64 * 1024, length))
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+                length -= len(chunk)
     
     def handle_get_cep(self, cep):
         """Consultar CEP via ViaCEP"""
@@ -523,12 +3138,10 @@ class ProjectHandler(http.server.SimpleHTTPRequestHandler):
             return
         
         try:
-            # Consulta ViaCEP
-            url = f'https://viacep.com.br/ws/{cep}/json/'
-            with urllib.request.urlopen(url, timeout=5) as response:
-                data = json.loads(response.read().decode('utf-8'))
+            # Consulta ViaCEP (com cache e coalescencia)
+            data = cep_resolver.resolve(cep)
                 
-            if 'erro' in data:
+            if data is None:
                 self.send_json_response({'error': 'CEP nao encontrado'}, 404)
             else:
                 self.send_json_response({'success': True, 'data': data})
@@ -546,6 +3159,58 @@ class ProjectHandler(http.server.SimpleHTTPRequestHandler):
                 }
             })
     
+    def handle_metrics(self):
+        """Metricas do processo no formato texto do Prometheus"""
+        body = metrics.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def handle_get_stats(self):
+        """Estatisticas dos projetos do usuario
+        
+        Vem dos contadores de project_stats/project_stats_monthly, mantidos por
+        triggers na mesma transacao de cada alteracao: o custo nao depende do
+        numero de projetos.
+        """
+        user_id = self.verify_token()
+        if not user_id:
+            self.send_json_response({'error': 'Token invalido'}, 401)
+            return
+        
+        try:
+            with project_shards.connection(user_id) as conn:
+                cursor = conn.cursor()
+                cursor.execute('BEGIN')
+                cursor.execute('''
+                    SELECT total, pinned, with_image, priority_low, priority_medium, priority_high, texto_chars
+                    FROM project_stats WHERE user_id = ?
+                ''', (user_id,))
+                row = cursor.fetchone() or (0,) * 7
+                cursor.execute('''
+                    SELECT month, total FROM project_stats_monthly
+                    WHERE user_id = ? AND total > 0 AND month != ''
+                    ORDER BY month DESC LIMIT ?
+                ''', (user_id, STATS_MONTHS))
+                months = cursor.fetchall()
+            
+            total, pinned, with_image, low, medium, high, texto_chars = row
+            self.send_json_response({
+                'success': True,
+                'total': total,
+                'pinned': pinned,
+                'with_image': with_image,
+                'by_priority': {'low': low, 'medium': medium, 'high': high},
+                'average_text_length': round(texto_chars / total) if total else 0,
+                'created_by_month': [{'month': month, 'count': count} for month, count in reversed(months)]
+            })
+            
+        except Exception as e:
+            self.send_internal_error(e)
+    
     def handle_get_quotes(self):
         """Buscar citacoes motivacionais"""
         import random
@@ -563,40 +3228,207 @@ class ProjectHandler(http.server.SimpleHTTPRequestHandler):
         quote = random.choice(quotes)
         self.send_json_response({'success': True, 'quote': quote})
 
-def main():
-    print("Sistema de Gestao de Projetos - Servidor Full-Stack")
-    print("=" * 60)
-    print(f"Servidor rodando em: http://localhost:{PORT}")
-    print(f"Banco de dados: {DB_NAME}")
-    print(f"Frontend: http://localhost:{PORT}/lista.html")
-    print()
-    print("Funcionalidades:")
-    print("  • Autenticacao JWT")
-    print("  • CRUD de projetos")
-    print("  • APIs externas (ViaCEP)")
-    print("  • Dashboard integrado")
-    print("  • Sistema responsivo")
-    print()
-    print("Pressione Ctrl+C para parar o servidor")
-    print("=" * 60)
+class PooledHTTPServer(socketserver.TCPServer):
+    """Servidor com pool fixo de threads e fila de conexoes limitada
     
-    try:
-        # Inicializa banco na primeira execucao
-        conn = sqlite3.connect(DB_NAME)
-        cursor = conn.cursor()
+    Conexoes aceitas entram em uma fila de tamanho maximo `queue_size`;
+    `workers` threads consomem a fila. Com a fila cheia a conexao recebe
+    503 imediatamente em vez de esperar indefinidamente, e a que esperou
+    mais de `queue_wait_limit` segundos tambem.
+    """
+    allow_reuse_address = True
+    
+    def __init__(self, server_address, handler_class, workers=SERVER_WORKERS, queue_size=SERVER_QUEUE_SIZE,
+                 bind_and_activate=True, queue_wait_limit=QUEUE_WAIT_LIMIT):
+        self.workers = max(1, workers)
+        self.queue_wait_limit = queue_wait_limit if queue_wait_limit > 0 else float('inf')
+        self.pending = queue.Queue(maxsize=max(1, queue_size))
+        # Backlog do listen() acompanha a fila de conexoes
+        self.request_queue_size = max(5, queue_size)
+        self.draining = False
+        self.stopping = threading.Event()
+        self._closed = False
+        self.close_lock = threading.Lock()
+        super().__init__(server_address, handler_class, bind_and_activate)
+        
+        self.threads = []
+        for i in range(self.workers):
+            thread = threading.Thread(target=self.worker_loop, name=f'worker-{i}', daemon=True)
+            thread.start()
+            self.threads.append(thread)
+    
+    def process_request(self, request, client_address):
+        """Enfileira a conexao para um worker (ou rejeita se a fila estiver cheia)"""
+        try:
+            self.pending.put_nowait((request, client_address, time.monotonic()))
+        except queue.Full:
+            metrics.observe_shed('queue_full')
+            self.reject_request(request)
+    
+    def worker_loop(self):
+        """Loop de cada thread do pool"""
+        while True:
+            try:
+                item = self.pending.get(timeout=WORKER_STOP_POLL)
+            except queue.Empty:
+                # Fila vazia depois do server_close: nada mais vai chegar
+                if self.stopping.is_set():
+                    return
+                continue
+            if item is None:
+                return
+            request, client_address, queued_at = item
+            if time.monotonic() - queued_at > self.queue_wait_limit:
+                # Cliente provavelmente ja desistiu: responder rapido esvazia a fila
+                metrics.observe_shed('queue_wait')
+                self.reject_request(request)
+                continue
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+    
+    def reject_request(self, request):
+        """Responde 503 sem ocupar um worker"""
+        body = json.dumps({'error': 'Servidor sobrecarregado, tente novamente'}).encode('utf-8')
+        response = (
+            b'HTTP/1.0 503 Service Unavailable\r\n'
+            b'Content-Type: application/json\r\n'
+            b'Retry-After: ' + str(SHED_RETRY_AFTER).encode() + b'\r\n'
+            b'Connection: close\r\n'
+            b'Content-Length: ' + str(len(body)).encode() + b'\r\n\r\n' + body
+        )
+        try:
+            request.sendall(response)
+        except OSError:
+            pass
+        self.shutdown_request(request)
+    
+    def server_close(self):
+        """Fecha o socket e para os workers depois das conexoes ja na fila
         
-        # Tabela de usuarios
-        cursor.execute('''
+        Pode ser chamado mais de uma vez (drain e saida do `with`). Nao
+        bloqueia: com a fila cheia os sentinelas que nao cabem sao
+        dispensados e os workers param pelo `stopping` ao esvazia-la.
+        """
+        with self.close_lock:
+            if self._closed:
+                return
+            self._closed = True
+        super().server_close()
+        self.stopping.set()
+        for _ in self.threads:
+            try:
+                self.pending.put_nowait(None)
+            except queue.Full:
+                break
+    
+    def drain(self, timeout=DRAIN_TIMEOUT):
+        """Para de aceitar conexoes e espera os workers terminarem as que ja tem"""
+        self.draining = True
+        self.shutdown()
+        self.server_close()
+        deadline = time.monotonic() + timeout
+        for thread in self.threads:
+            thread.join(max(0, deadline - time.monotonic()))
+
+
+def create_server(address, mode=SERVER_MODE, workers=SERVER_WORKERS, queue_size=SERVER_QUEUE_SIZE,
+                  handler_class=ProjectHandler, keepalive_timeout=KEEPALIVE_TIMEOUT,
+                  keepalive_requests=KEEPALIVE_MAX_REQUESTS, sock=None, max_in_flight=MAX_IN_FLIGHT):
+    """Cria o servidor HTTP no modo de concorrencia escolhido
+    
+    Com `sock` o servidor usa esse socket ja escutando (herdado do supervisor
+    no modo prefork) em vez de abrir outro em `address`. `max_in_flight`
+    limita as requisicoes processadas ao mesmo tempo (0 = numero de workers).
+    """
+    bind = sock is None
+    if mode == 'single':
+        server = socketserver.TCPServer(address, handler_class, bind)
+        # Uma conexao ociosa travaria todas as outras: sem keep-alive
+        keepalive_requests = 1
+    elif mode == 'threaded':
+        server = PooledHTTPServer(address, handler_class, workers=workers, queue_size=queue_size,
+                                  bind_and_activate=bind)
+    else:
+        raise ValueError(f'Modo de servidor invalido: {mode}')
+    if sock is not None:
+        server.socket.close()
+        server.socket = sock
+        server.server_address = sock.getsockname()
+    server.keepalive_timeout = keepalive_timeout
+    server.keepalive_requests = max(1, keepalive_requests)
+    if mode == 'threaded':
+        # Workers parados em conexoes keep-alive ociosas nao contam, so requisicoes em andamento
+        server.admission = threading.BoundedSemaphore(max_in_flight if max_in_flight > 0 else server.workers)
+    return server
+
+
+def install_drain_handler(server):
+    """SIGTERM: para de aceitar conexoes e termina as requisicoes em andamento"""
+    stop = threading.Event()
+    # shutdown() espera o serve_forever da thread principal: precisa rodar em outra thread
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    def drain_on_sigterm():
+        stop.wait()
+        logger.info('SIGTERM recebido, terminando requisicoes em andamento')
+        server.drain()
+    threading.Thread(target=drain_on_sigterm, daemon=True).start()
+
+
+def migrate_inline_images(conn):
+    """Move imagens base64 de projects.image_path para o armazenamento em disco
+    
+    So linhas cuja imagem foi gravada perdem o image_path; valores que nao
+    sao um data URL valido (link externo, base64 truncado) ficam como estao.
+    """
+    moved = 0
+    kept = 0
+    last_id = 0
+    while True:
+        # Lotes pequenos: cada linha pode ter ~2.7MB de base64
+        rows = conn.execute('''
+            SELECT id, image_path FROM projects
+            WHERE id > ? AND image_path IS NOT NULL AND image_path != ''
+            ORDER BY id LIMIT 50
+        ''', (last_id,)).fetchall()
+        if not rows:
+            break
+        for project_id, image_path in rows:
+            try:
+                image_key = image_store.put_data_url(image_path)
+            except ValueError as e:
+                kept += 1
+                logger.warning('projeto %d: image_path mantido sem migrar (%s)', project_id, e)
+                continue
+            conn.execute(
+                'UPDATE projects SET image_key = ?, image_path = NULL WHERE id = ?',
+                (image_key, project_id)
+            )
+            moved += 1
+        last_id = rows[-1][0]
+    if moved:
+        logger.info('%d imagem(ns) movida(s) para %s/', moved, image_store.root)
+    if kept:
+        logger.warning('%d image_path(s) nao convertido(s) mantido(s) em projects', kept)
+
+
+# Migracoes de schema: (versao, descricao, passos). A versao aplicada fica em
+# PRAGMA user_version; cada passo e um SQL ou uma funcao que recebe a conexao.
+# Nunca altere uma migracao ja publicada, apenas acrescente novas ao final.
+MIGRATIONS = [
+    (1, 'tabelas users e projects', [
+        '''
         CREATE TABLE IF NOT EXISTS users (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             username TEXT UNIQUE NOT NULL,
             email TEXT UNIQUE NOT NULL,
             password TEXT NOT NULL,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )''')
-        
-        # Tabela de projetos
-        cursor.execute('''
+        )''',
+        '''
         CREATE TABLE IF NOT EXISTS projects (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             user_id INTEGER NOT NULL,
@@ -608,18 +3440,510 @@ def main():
             order_index INTEGER DEFAULT 0,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             FOREIGN KEY (user_id) REFERENCES users (id)
-        )''')
+        )''',
+    ]),
+    # pinned DESC no indice casa com o ORDER BY da listagem (sem ordenacao temporaria)
+    (2, 'indice da listagem (user_id, pinned, order_index)', [
+        'CREATE INDEX IF NOT EXISTS idx_projects_user_pinned_order ON projects (user_id, pinned DESC, order_index)',
+    ]),
+    (3, 'indice do MAX(order_index) por usuario', [
+        'CREATE INDEX IF NOT EXISTS idx_projects_user_order ON projects (user_id, order_index)',
+    ]),
+    # image_path (base64 inline) fica obsoleto; so e lido por esta migracao
+    (4, 'imagens fora da tabela projects (armazenamento por hash)', [
+        'ALTER TABLE projects ADD COLUMN image_key TEXT',
+        migrate_inline_images,
+    ]),
+    # Contador por usuario incrementado a cada alteracao em seus projetos (ETag da listagem)
+    (5, 'versao da lista de projetos por usuario', [
+        'ALTER TABLE users ADD COLUMN projects_version INTEGER NOT NULL DEFAULT 0',
+    ]),
+    # data NULL = CEP inexistente (cache negativo)
+    (6, 'cache persistente de CEP', [
+        '''
+        CREATE TABLE IF NOT EXISTS cep_cache (
+            cep TEXT PRIMARY KEY,
+            data TEXT,
+            expires_at REAL NOT NULL
+        )''',
+    ]),
+    # Usada so com LOGIN_LIMITER=sqlite (contador de janela deslizante por IP)
+    (7, 'rate limiting de login compartilhado', [
+        '''
+        CREATE TABLE IF NOT EXISTS login_attempts (
+            key TEXT PRIMARY KEY,
+            window_id INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            previous INTEGER NOT NULL
+        ) WITHOUT ROWID''',
+    ]),
+    # Indice FTS5 com conteudo externo (le o texto de projects); user_id entra
+    # como coluna indexada para a busca filtrar pelo usuario dentro do MATCH.
+    # O trigger de UPDATE so dispara quando texto/description mudam: mover,
+    # reordenar e fixar nao tocam no indice.
+    (8, 'busca textual em projects (FTS5)', [
+        '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS projects_fts USING fts5(
+            texto, description, user_id,
+            content='projects', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS projects_fts_insert AFTER INSERT ON projects BEGIN
+            INSERT INTO projects_fts (rowid, texto, description, user_id)
+            VALUES (new.id, new.texto, new.description, new.user_id);
+        END''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS projects_fts_delete AFTER DELETE ON projects BEGIN
+            INSERT INTO projects_fts (projects_fts, rowid, texto, description, user_id)
+            VALUES ('delete', old.id, old.texto, old.description, old.user_id);
+        END''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS projects_fts_update AFTER UPDATE OF texto, description, user_id ON projects BEGIN
+            INSERT INTO projects_fts (projects_fts, rowid, texto, description, user_id)
+            VALUES ('delete', old.id, old.texto, old.description, old.user_id);
+            INSERT INTO projects_fts (rowid, texto, description, user_id)
+            VALUES (new.id, new.texto, new.description, new.user_id);
+        END''',
+        "INSERT INTO projects_fts (projects_fts) VALUES ('rebuild')",
+    ]),
+    (9, 'contadores de estatisticas por usuario', [
+        '''
+        CREATE TABLE IF NOT EXISTS project_stats (
+            user_id INTEGER PRIMARY KEY REFERENCES users(id),
+            total INTEGER NOT NULL DEFAULT 0,
+            pinned INTEGER NOT NULL DEFAULT 0,
+            with_image INTEGER NOT NULL DEFAULT 0,
+            priority_low INTEGER NOT NULL DEFAULT 0,
+            priority_medium INTEGER NOT NULL DEFAULT 0,
+            priority_high INTEGER NOT NULL DEFAULT 0,
+            texto_chars INTEGER NOT NULL DEFAULT 0
+        )''',
+        '''
+        CREATE TABLE IF NOT EXISTS project_stats_monthly (
+            user_id INTEGER NOT NULL REFERENCES users(id),
+            month TEXT NOT NULL,
+            total INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, month)
+        ) WITHOUT ROWID''',
+        # Triggers: os contadores mudam na mesma transacao da alteracao em projects
+        '''
+        CREATE TRIGGER IF NOT EXISTS project_stats_insert AFTER INSERT ON projects BEGIN
+            INSERT INTO project_stats (user_id, total, pinned, with_image, priority_low, priority_medium, priority_high, texto_chars)
+            VALUES (new.user_id, 1, coalesce(new.pinned, 0) != 0, coalesce(new.image_key, '') != '',
+                    new.priority IS 'low', new.priority IS 'medium', new.priority IS 'high',
+                    coalesce(length(new.texto), 0))
+            ON CONFLICT (user_id) DO UPDATE SET
+                total = total + 1,
+                pinned = pinned + excluded.pinned,
+                with_image = with_image + excluded.with_image,
+                priority_low = priority_low + excluded.priority_low,
+                priority_medium = priority_medium + excluded.priority_medium,
+                priority_high = priority_high + excluded.priority_high,
+                texto_chars = texto_chars + excluded.texto_chars;
+            INSERT INTO project_stats_monthly (user_id, month, total)
+            VALUES (new.user_id, coalesce(strftime('%Y-%m', new.created_at), ''), 1)
+            ON CONFLICT (user_id, month) DO UPDATE SET total = total + 1;
+        END''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS project_stats_delete AFTER DELETE ON projects BEGIN
+            UPDATE project_stats SET
+                total = total - 1,
+                pinned = pinned - (coalesce(old.pinned, 0) != 0),
+                with_image = with_image - (coalesce(old.image_key, '') != ''),
+                priority_low = priority_low - (old.priority IS 'low'),
+                priority_medium = priority_medium - (old.priority IS 'medium'),
+                priority_high = priority_high - (old.priority IS 'high'),
+                texto_chars = texto_chars - coalesce(length(old.texto), 0)
+            WHERE user_id = old.user_id;
+            UPDATE project_stats_monthly SET total = total - 1
+            WHERE user_id = old.user_id AND month = coalesce(strftime('%Y-%m', old.created_at), '');
+        END''',
+        # order_index fica de fora: mover projetos nao dispara nada
+        '''
+        CREATE TRIGGER IF NOT EXISTS project_stats_update
+        AFTER UPDATE OF texto, priority, pinned, image_key, user_id ON projects BEGIN
+            UPDATE project_stats SET
+                total = total - 1,
+                pinned = pinned - (coalesce(old.pinned, 0) != 0),
+                with_image = with_image - (coalesce(old.image_key, '') != ''),
+                priority_low = priority_low - (old.priority IS 'low'),
+                priority_medium = priority_medium - (old.priority IS 'medium'),
+                priority_high = priority_high - (old.priority IS 'high'),
+                texto_chars = texto_chars - coalesce(length(old.texto), 0)
+            WHERE user_id = old.user_id;
+            INSERT INTO project_stats (user_id, total, pinned, with_image, priority_low, priority_medium, priority_high, texto_chars)
+            VALUES (new.user_id, 1, coalesce(new.pinned, 0) != 0, coalesce(new.image_key, '') != '',
+                    new.priority IS 'low', new.priority IS 'medium', new.priority IS 'high',
+                    coalesce(length(new.texto), 0))
+            ON CONFLICT (user_id) DO UPDATE SET
+                total = total + 1,
+                pinned = pinned + excluded.pinned,
+                with_image = with_image + excluded.with_image,
+                priority_low = priority_low + excluded.priority_low,
+                priority_medium = priority_medium + excluded.priority_medium,
+                priority_high = priority_high + excluded.priority_high,
+                texto_chars = texto_chars + excluded.texto_chars;
+        END''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS project_stats_monthly_update
+        AFTER UPDATE OF user_id, created_at ON projects BEGIN
+            UPDATE project_stats_monthly SET total = total - 1
+            WHERE user_id = old.user_id AND month = coalesce(strftime('%Y-%m', old.created_at), '');
+            INSERT INTO project_stats_monthly (user_id, month, total)
+            VALUES (new.user_id, coalesce(strftime('%Y-%m', new.created_at), ''), 1)
+            ON CONFLICT (user_id, month) DO UPDATE SET total = total + 1;
+        END''',
+        '''
+        INSERT OR REPLACE INTO project_stats (user_id, total, pinned, with_image, priority_low, priority_medium, priority_high, texto_chars)
+        SELECT user_id, COUNT(*), SUM(coalesce(pinned, 0) != 0), SUM(coalesce(image_key, '') != ''),
+               SUM(priority IS 'low'), SUM(priority IS 'medium'), SUM(priority IS 'high'), SUM(coalesce(length(texto), 0))
+        FROM projects GROUP BY user_id''',
+        '''
+        INSERT OR REPLACE INTO project_stats_monthly (user_id, month, total)
+        SELECT user_id, coalesce(strftime('%Y-%m', created_at), ''), COUNT(*)
+        FROM projects GROUP BY user_id, coalesce(strftime('%Y-%m', created_at), '')''',
+    ]),
+    # Versao da lista sai de users: com shards ela precisa ficar no mesmo
+    # arquivo que os projetos para mudar na mesma transacao
+    (10, 'versao da lista em project_versions', [
+        '''
+        CREATE TABLE IF NOT EXISTS project_versions (
+            user_id INTEGER PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )''',
+        '''
+        INSERT OR REPLACE INTO project_versions (user_id, version)
+        SELECT id, projects_version FROM users WHERE projects_version != 0''',
+    ]),
+    # Usada so com TOKEN_REVOCATIONS=sqlite: digest = logout de um token,
+    # user_id/revoked_before = todos os tokens do usuario (troca de senha)
+    (11, 'revogacao de tokens compartilhada', [
+        '''
+        CREATE TABLE IF NOT EXISTS token_revocations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            digest BLOB,
+            user_id INTEGER,
+            revoked_before INTEGER,
+            expires_at REAL NOT NULL
+        )''',
+    ]),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def apply_migrations(conn, target=SCHEMA_VERSION):
+    """Aplica as migracoes pendentes ate `target` e retorna a versao final
+    
+    Com o banco ja atualizado custa uma leitura de PRAGMA user_version.
+    Cada migracao roda em sua propria transacao (BEGIN IMMEDIATE), entao
+    varios processos iniciando juntos nao aplicam a mesma migracao duas vezes.
+    """
+    current = conn.execute('PRAGMA user_version').fetchone()[0]
+    if current >= target:
+        return current
+    
+    for version, description, steps in MIGRATIONS:
+        if version <= current or version > target:
+            continue
         
-        conn.commit()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Outro processo pode ter migrado enquanto esperavamos o lock
+            if conn.execute('PRAGMA user_version').fetchone()[0] >= version:
+                conn.execute('ROLLBACK')
+                continue
+            logger.info('Aplicando migracao %d: %s', version, description)
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            conn.execute(f'PRAGMA user_version = {version}')
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        current = version
+    
+    return current
+
+
+def init_db(db_name=DB_NAME):
+    """Cria ou atualiza o schema do banco"""
+    conn = sqlite3.connect(db_name, isolation_level=None)
+    try:
+        return apply_migrations(conn)
+    finally:
+        conn.close()
+
+
+def max_project_id(path):
+    """Maior id de projects ja alocado no arquivo (inclusive de projetos apagados)"""
+    conn = sqlite3.connect(path)
+    try:
+        row = conn.execute('''
+            SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'projects'), 0),
+                       COALESCE((SELECT MAX(id) FROM projects), 0))
+        ''').fetchone()
+        return row[0]
+    finally:
+        conn.close()
+
+
+def shard_id_base(max_id):
+    """Inicio das faixas de ids de um particionamento novo, acima de `max_id`"""
+    return (max_id // SHARD_ID_SPAN + 1) * SHARD_ID_SPAN
+
+
+def init_shard(path, index, base=SHARD_ID_SPAN):
+    """Cria ou atualiza um shard (mesmo schema do banco principal)
+    
+    Um shard novo aloca ids de projects a partir de `base + index *
+    SHARD_ID_SPAN`, com `base` acima de todo id ja usado (`shard_id_base`):
+    ids nao se repetem entre shards nem com os projetos copiados para eles,
+    e o reshard pode juntar projetos de varios arquivos sem renumerar.
+    """
+    conn = sqlite3.connect(path, isolation_level=None)
+    try:
+        apply_migrations(conn)
+        conn.execute('''
+            INSERT INTO sqlite_sequence (name, seq)
+            SELECT 'projects', ? WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'projects')
+        ''', (base + index * SHARD_ID_SPAN,))
+    finally:
+        conn.close()
+
+
+def shard_files(shard_dir=SHARD_DIR):
+    """Arquivos de shard existentes em `shard_dir`, de qualquer particionamento"""
+    return sorted(glob.glob(os.path.join(shard_dir, 'projects-*-of-*.db')))
+
+
+def init_storage(shard_count=SHARD_COUNT, shard_dir=SHARD_DIR, db_name=DB_NAME):
+    """Cria/atualiza o banco principal e os shards, recusando um layout misturado
+    
+    Projetos em outro particionamento (outro numero de shards, ou ainda no
+    banco principal com shards ligados) ficariam invisiveis: nesse caso o
+    servidor nao sobe e o erro indica o scripts/reshard.py.
+    """
+    init_db(db_name)
+    expected = {shard_path(i, shard_count, shard_dir) for i in range(shard_count)}
+    stray = [path for path in shard_files(shard_dir) if path not in expected]
+    if stray:
+        raise RuntimeError(f'{len(stray)} shard(s) de outro particionamento em {shard_dir}/; '
+                           f'rode scripts/reshard.py --shards {shard_count}')
+    if not shard_count:
+        return
+    conn = sqlite3.connect(db_name)
+    try:
+        unsharded = conn.execute('SELECT 1 FROM projects LIMIT 1').fetchone()
+    finally:
         conn.close()
+    if unsharded:
+        raise RuntimeError(f'{db_name} ainda tem projetos fora dos shards; '
+                           f'rode scripts/reshard.py --shards {shard_count}')
+    os.makedirs(shard_dir, exist_ok=True)
+    base = shard_id_base(max_project_id(db_name))
+    for index in range(shard_count):
+        init_shard(shard_path(index, shard_count, shard_dir), index, base)
+
+
+def serve_worker(sock, args):
+    """Processo filho do modo prefork: pool de threads proprio no socket herdado"""
+    global db_pool, project_shards
+    # Ctrl+C chega a todo o grupo de processos; quem coordena a parada e o supervisor
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    configure_logging()
+    
+    # Conexoes SQLite nao podem atravessar o fork: cada processo abre as suas
+    db_pool = ConnectionPool(DB_NAME, size=args.workers)
+    project_shards = ProjectShards(args.shards, pool_size=args.workers)
+    server = create_server(sock.getsockname(), 'threaded', args.workers, args.queue_size,
+                           keepalive_timeout=args.keepalive_timeout,
+                           keepalive_requests=args.keepalive_requests, sock=sock,
+                           max_in_flight=args.max_in_flight)
+    server.change_events = False
+    install_drain_handler(server)
+    
+    logger.info('worker pid=%d pronto', os.getpid())
+    server.serve_forever()
+    # serve_forever so retorna depois do shutdown(): espera o drain terminar
+    for thread in server.threads:
+        thread.join(DRAIN_TIMEOUT)
+    password_hasher.shutdown()
+    project_shards.close_all()
+    db_pool.close_all()
+    logger.info('worker pid=%d encerrado', os.getpid())
+
+
+def run_prefork(args):
+    """Supervisor: abre o socket, cria os processos e recria os que cairem
+    
+    Os filhos herdam o socket ja escutando e disputam o accept() (socket nao
+    bloqueante: quem perde recebe EAGAIN e volta a esperar). SIGTERM ou Ctrl+C
+    no supervisor e repassado como SIGTERM aos filhos, que terminam as
+    requisicoes em andamento antes de sair.
+    """
+    sock = socket.create_server(('', args.port), backlog=max(5, args.queue_size) * args.processes)
+    sock.setblocking(False)
+    supervisor_pid = os.getpid()
+    children = set()
+    stopping = False
+    
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                serve_worker(sock, args)
+            except BaseException as e:
+                logger.error('worker pid=%d erro: %s', os.getpid(), e)
+                code = 1
+            finally:
+                # os._exit nao roda atexit: esvazia a fila do log antes
+                flush_logging()
+                os._exit(code)
+        children.add(pid)
+    
+    def stop(signum, frame):
+        nonlocal stopping
+        # Filho recem-criado que ainda nao trocou os handlers herdados
+        if os.getpid() != supervisor_pid:
+            return
+        stopping = True
+        # Os filhos fecham as suas copias ao iniciar o drain; com a do supervisor
+        # fechada o kernel passa a recusar conexoes novas
+        sock.close()
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+    
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    
+    for _ in range(args.processes):
+        spawn()
+    
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        children.discard(pid)
+        if not stopping:
+            logger.warning('worker pid=%d saiu (status %d), reiniciando', pid, status)
+            time.sleep(WORKER_RESTART_DELAY)
+            if not stopping:
+                spawn()
+    sock.close()
+
+
+def parse_args(argv=None):
+    """Argumentos de linha de comando (padroes vindos das variaveis de ambiente)"""
+    parser = argparse.ArgumentParser(description='Sistema de Gestao de Projetos')
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--mode', choices=['threaded', 'prefork', 'single'], default=SERVER_MODE,
+                        help='threaded: pool de threads; prefork: varios processos com pool de '
+                             'threads cada; single: uma requisicao por vez')
+    parser.add_argument('--workers', type=int, default=SERVER_WORKERS, help='threads no pool (por processo)')
+    parser.add_argument('--processes', type=int, default=SERVER_PROCESSES,
+                        help='processos no modo prefork (padrao: numero de CPUs)')
+    parser.add_argument('--queue-size', type=int, default=SERVER_QUEUE_SIZE,
+                        help='conexoes aguardando um worker antes de responder 503')
+    parser.add_argument('--keepalive-timeout', type=float, default=KEEPALIVE_TIMEOUT,
+                        help='segundos que uma conexao ociosa fica aberta')
+    parser.add_argument('--keepalive-requests', type=int, default=KEEPALIVE_MAX_REQUESTS,
+                        help='requisicoes por conexao antes de fecha-la (1 = sem keep-alive)')
+    parser.add_argument('--max-in-flight', type=int, default=MAX_IN_FLIGHT,
+                        help='requisicoes processadas ao mesmo tempo antes de responder 503 '
+                             '(por processo; 0 = numero de workers)')
+    parser.add_argument('--shards', type=int, default=SHARD_COUNT,
+                        help=f'arquivos de projetos em {SHARD_DIR}/, particionados por usuario '
+                             '(0 = tudo no banco principal; mudar exige scripts/reshard.py)')
+    args = parser.parse_args(argv)
+    if args.mode == 'prefork' and not hasattr(os, 'fork'):
+        parser.error('o modo prefork precisa de os.fork (Linux/macOS); use --mode threaded')
+    return args
+
+def main():
+    args = parse_args()
+    configure_logging()
+    print("Sistema de Gestao de Projetos - Servidor Full-Stack")
+    print("=" * 60)
+    print(f"Servidor rodando em: http://localhost:{args.port}")
+    print(f"Banco de dados: {DB_NAME}" + (f" + {args.shards} shards em {SHARD_DIR}/" if args.shards else ""))
+    print(f"Frontend: http://localhost:{args.port}/lista.html")
+    if args.mode == 'threaded':
+        print(f"Modo: threaded ({args.workers} workers, fila de {args.queue_size} conexoes)")
+    elif args.mode == 'prefork':
+        print(f"Modo: prefork ({args.processes} processos x {args.workers} workers)")
+    else:
+        print("Modo: single (uma requisicao por vez)")
+    print()
+    print("Funcionalidades:")
+    print("  • Autenticacao JWT")
+    print("  • CRUD de projetos")
+    print("  • APIs externas (ViaCEP)")
+    print("  • Dashboard integrado")
+    print("  • Sistema responsivo")
+    print()
+    print("Pressione Ctrl+C para parar o servidor")
+    print("=" * 60)
+    
+    global db_pool, project_shards, login_limiter, token_cache
+    try:
+        # Inicializa banco na primeira execucao
+        init_storage(args.shards)
+        static_cache.preload(STATIC_PRELOAD)
+        # Le o manifest e confere os fontes (avisa no log se o build estiver desatualizado)
+        static_cache.preload(build_manifest.files())
+        
+        if args.mode == 'prefork':
+            # Limite de login precisa valer para todos os processos
+            if 'LOGIN_LIMITER' not in os.environ:
+                login_limiter = SqliteLoginRateLimiter()
+            # Logout e troca de senha tambem: o contador compartilhado e herdado no fork
+            if os.environ.get('TOKEN_REVOCATIONS', 'sqlite') == 'sqlite':
+                token_cache = create_token_cache('sqlite', generation=multiprocessing.Value('q', 0))
+            run_prefork(args)
+            print("\n\nServidor parado com sucesso!")
+            return
         
-        with socketserver.TCPServer(("", PORT), ProjectHandler) as httpd:
-            httpd.serve_forever()
+        pool_size = args.workers if args.mode == 'threaded' else 1
+        db_pool = ConnectionPool(DB_NAME, size=pool_size)
+        project_shards = ProjectShards(args.shards, pool_size=pool_size)
+        httpd = create_server(("", args.port), args.mode, args.workers, args.queue_size,
+                              keepalive_timeout=args.keepalive_timeout,
+                              keepalive_requests=args.keepalive_requests,
+                              max_in_flight=args.max_in_flight)
+        try:
+            with httpd:
+                if args.mode == 'threaded':
+                    install_drain_handler(httpd)
+                try:
+                    httpd.serve_forever()
+                except KeyboardInterrupt:
+                    # serve_forever ja parou; a saida do with fecha o servidor e para os workers
+                    httpd.draining = True
+                    raise
+        finally:
+            # Workers terminam as conexoes ja aceitas (depois de um SIGTERM o drain tambem espera)
+            for thread in getattr(httpd, 'threads', ()):
+                thread.join(DRAIN_TIMEOUT)
+            password_hasher.shutdown()
+            project_shards.close_all()
+            db_pool.close_all()
     except KeyboardInterrupt:
         print("\n\nServidor parado com sucesso!")
     except Exception as e:
         print(f"Erro no servidor: {e}")
-        print("Verifique se a porta 8000 está disponível.")
+        print(f"Verifique se a porta {args.port} está disponível.")
+    finally:
+        flush_logging()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -33,7 +33,15 @@ class AuthManager {
   }
 
   static logout() {
-    const hadToken = !!this.getToken();
+    const token = this.getToken();
+    const hadToken = !!token;
+    if (hadToken) {
+      // Revogar o token no servidor (sem esperar a resposta)
+      fetch(`${API_BASE_URL}/logout`, {
+        method: 'POST',
+        headers: { 'Authorization': `Bearer ${token}` }
+      }).catch(() => {});
+    }
     this.removeToken();
     this.removeUser();
     // Evitar loop de reload: só redirecionar se não estivermos já na lista OU se token existia e queremos reiniciar.
@@ -136,6 +144,13 @@ class ApiClient {
     });
   }
 
+  static async patch(endpoint, data) {
+    return this.request(endpoint, {
+      method: 'PATCH',
+      body: JSON.stringify(data)
+    });
+  }
+
   static async delete(endpoint) {
     return this.request(endpoint, {
       method: 'DELETE'
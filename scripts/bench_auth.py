@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark do custo de autenticacao por requisicao no basic_server.py
+
+Compara a verificacao completa do JWT (`jwt.decode`: HMAC + parse do JSON,
+como `verify_token` fazia em toda requisicao) com o `TokenCache`, que so
+verifica o token na primeira vez e depois responde pelo digest.
+
+Uso:
+    python scripts/bench_auth.py --iterations 100000
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+import jwt
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import basic_server  # noqa: E402
+
+
+def per_call_us(fn, token, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn(token)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Micro-benchmark de verify_token do basic_server.py')
+    parser.add_argument('--iterations', type=int, default=100000)
+    args = parser.parse_args()
+
+    token = jwt.encode({
+        'user_id': 1,
+        'username': 'bench',
+        'iat': datetime.now(timezone.utc),
+        'exp': datetime.now(timezone.utc) + timedelta(days=7)
+    }, basic_server.SECRET_KEY, algorithm='HS256')
+
+    def full_decode(value):
+        return jwt.decode(value, basic_server.SECRET_KEY, algorithms=['HS256'])['user_id']
+
+    cache = basic_server.TokenCache()
+    assert cache.verify(token) == full_decode(token) == 1
+
+    before = per_call_us(full_decode, token, args.iterations)
+    after = per_call_us(cache.verify, token, args.iterations)
+    print(f"{args.iterations} verificacoes do mesmo token")
+    print(f"  jwt.decode   {before:8.2f} us/requisicao")
+    print(f"  TokenCache   {after:8.2f} us/requisicao  ({before / after:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
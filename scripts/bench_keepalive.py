@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark de conexoes persistentes (HTTP/1.1 keep-alive) do basic_server.py
+
+Sobe o servidor em uma porta livre com um banco temporario e mede a latencia
+de uma sequencia de requisicoes autenticadas (como o front faz ao reordenar
+projetos) em dois cenarios:
+
+- sem keep-alive (`keepalive_requests=1`, comportamento HTTP/1.0 antigo):
+  uma conexao TCP nova por requisicao
+- com keep-alive: todas as requisicoes de cada cliente na mesma conexao
+
+Uso:
+    python scripts/bench_keepalive.py --clients 4 --requests 500
+"""
+
+import argparse
+import http.client
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import basic_server  # noqa: E402
+
+
+class QuietHandler(basic_server.ProjectHandler):
+    def log_message(self, format, *args):
+        # Log de acesso no stderr distorce a medicao
+        pass
+
+
+def start_server(keepalive_requests, workers):
+    server = basic_server.create_server(('127.0.0.1', 0), 'threaded', workers, queue_size=64,
+                                        handler_class=QuietHandler,
+                                        keepalive_requests=keepalive_requests)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def login(port, name):
+    """Cria um usuario e retorna o token"""
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    body = json.dumps({'username': name, 'email': f'{name}@exemplo.com', 'password': 'bench123'})
+    conn.request('POST', '/api/register', body=body, headers={'Content-Type': 'application/json'})
+    data = json.loads(conn.getresponse().read())
+    conn.close()
+    return data['token']
+
+
+def run_client(port, token, requests, latencies, lock):
+    headers = {'Authorization': f'Bearer {token}'}
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    local = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        conn.request('GET', '/api/lists?limit=20', headers=headers)
+        response = conn.getresponse()
+        response.read()
+        local.append((time.perf_counter() - start) * 1000)
+        # Servidor pediu para fechar: a proxima requisicao abre outra conexao
+        if response.will_close:
+            conn.close()
+    conn.close()
+    with lock:
+        latencies.extend(local)
+
+
+def run_round(label, keepalive_requests, args):
+    server = start_server(keepalive_requests, args.workers)
+    port = server.server_address[1]
+    token = login(port, f'bench{keepalive_requests}')
+
+    latencies = []
+    lock = threading.Lock()
+    threads = [threading.Thread(target=run_client, args=(port, token, args.requests, latencies, lock))
+               for _ in range(args.clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    server.shutdown()
+    server.server_close()
+
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(f"{label:<14}{len(latencies) / elapsed:>10.0f}{statistics.median(latencies):>10.3f}{p99:>10.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de keep-alive do basic_server.py')
+    parser.add_argument('--clients', type=int, default=4, help='clientes concorrentes')
+    parser.add_argument('--requests', type=int, default=500, help='requisicoes por cliente')
+    parser.add_argument('--workers', type=int, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        basic_server.init_db(db_path)
+        basic_server.DB_NAME = db_path
+        basic_server.db_pool = basic_server.ConnectionPool(db_path, size=args.workers)
+
+        print(f"{args.clients} clientes x {args.requests} requisicoes (GET /api/lists)")
+        print(f"{'cenario':<14}{'req/s':>10}{'p50 (ms)':>10}{'p99 (ms)':>10}")
+        run_round('sem keep-alive', 1, args)
+        run_round('keep-alive', basic_server.KEEPALIVE_MAX_REQUESTS, args)
+        basic_server.db_pool.close_all()
+
+
+if __name__ == '__main__':
+    main()
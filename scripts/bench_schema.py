@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark das migracoes de schema do basic_server.py
+
+Cria um banco temporario so com a migracao 1 (sem indices), popula
+`--projects` projetos espalhados entre `--users` usuarios e mede a latencia
+das consultas de listagem e de criacao usadas pelos handlers. Depois aplica
+as migracoes restantes e mede de novo, alem do custo do runner quando o banco
+ja esta atualizado (caso normal na inicializacao do servidor).
+
+Uso:
+    python scripts/bench_schema.py --projects 1000000 --users 1000
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import basic_server  # noqa: E402
+
+LIST_SQL = '''
+    SELECT id, texto, description, priority, image_path, pinned, order_index, created_at
+    FROM projects WHERE user_id = ? ORDER BY pinned DESC, order_index ASC
+'''
+
+
+def seed(conn, users, projects):
+    """Popula usuarios e projetos em lotes"""
+    conn.execute('BEGIN')
+    conn.executemany(
+        'INSERT INTO users (username, email, password) VALUES (?, ?, ?)',
+        ((f'user{i}', f'user{i}@exemplo.com', 'x' * 64) for i in range(users))
+    )
+    rng = random.Random(42)
+    order = [0] * (users + 1)
+
+    def rows():
+        for i in range(projects):
+            user_id = rng.randint(1, users)
+            order[user_id] += 1
+            yield (user_id, f'Projeto numero {i}', 'descricao curta', 'medium', '',
+                   1 if rng.random() < 0.05 else 0, order[user_id])
+
+    conn.executemany('''
+        INSERT INTO projects (user_id, texto, description, priority, image_path, pinned, order_index)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', rows())
+    conn.execute('COMMIT')
+
+
+def measure(fn, repeat):
+    """Executa `fn` `repeat` vezes e retorna tempos em ms"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+def report(label, times):
+    times = sorted(times)
+    p95 = times[int(len(times) * 0.95) - 1] if len(times) > 1 else times[0]
+    print(f"  {label:<8} media {statistics.mean(times):8.3f} ms   p50 {statistics.median(times):8.3f} ms   p95 {p95:8.3f} ms")
+
+
+def run_queries(conn, user_id, repeat):
+    def list_projects():
+        conn.execute(LIST_SQL, (user_id,)).fetchall()
+
+    def create_project():
+        conn.execute('BEGIN')
+        max_order = conn.execute('SELECT MAX(order_index) FROM projects WHERE user_id = ?', (user_id,)).fetchone()[0] or 0
+        conn.execute('''
+            INSERT INTO projects (user_id, texto, description, priority, image_path, pinned, order_index)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (user_id, 'Projeto do benchmark', '', 'medium', '', 0, max_order + 1))
+        conn.execute('COMMIT')
+
+    report('listar', measure(list_projects, repeat))
+    report('criar', measure(create_project, repeat))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de schema/indices do basic_server.py')
+    parser.add_argument('--projects', type=int, default=1_000_000)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        conn = sqlite3.connect(db_path, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        basic_server.apply_migrations(conn, target=1)
+
+        start = time.perf_counter()
+        seed(conn, args.users, args.projects)
+        print(f"{args.projects} projetos / {args.users} usuarios populados em {time.perf_counter() - start:.1f} s")
+
+        user_id = 1
+        count = conn.execute('SELECT COUNT(*) FROM projects WHERE user_id = ?', (user_id,)).fetchone()[0]
+        print(f"Usuario medido: {user_id} ({count} projetos)")
+
+        print("\nSem indices (schema versao 1):")
+        run_queries(conn, user_id, args.repeat)
+
+        start = time.perf_counter()
+        version = basic_server.apply_migrations(conn)
+        print(f"\nMigracoes ate a versao {version} aplicadas em {time.perf_counter() - start:.2f} s")
+
+        print(f"\nCom indices (schema versao {version}):")
+        run_queries(conn, user_id, args.repeat)
+
+        noop = measure(lambda: basic_server.apply_migrations(conn), 1000)
+        print(f"\nRunner com banco atualizado: {statistics.mean(noop) * 1000:.1f} us por chamada")
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
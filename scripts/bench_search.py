@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark da busca textual (GET /api/lists/search) do basic_server.py
+
+Cria um banco temporario sem o indice FTS5, popula `--users` usuarios com
+`--projects` projetos cada (texto e descricao sorteados de um vocabulario com
+distribuicao de Zipf), mede o custo de uma criacao de projeto, aplica a
+migracao do FTS5 e mede de novo. Depois sobe o servidor e compara a busca
+pelo endpoint com o caminho antigo do front: baixar a lista inteira e
+filtrar no cliente.
+
+Uso:
+    python scripts/bench_search.py --projects 100000 --users 3
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import basic_server  # noqa: E402
+
+WORDS = '''
+projeto relatorio financeiro anual vendas marketing reforma cozinha sala quarto
+pintura orcamento planejamento reuniao cliente fornecedor contrato entrega prazo
+equipe desenvolvimento sistema aplicativo site loja estoque compra pedido nota
+fiscal imposto contabilidade auditoria treinamento curso palestra evento festa
+viagem hotel passagem documento cadastro pesquisa analise dados grafico painel
+servidor banco backup seguranca rede suporte chamado manutencao instalacao
+jardim piscina garagem telhado muro portao eletrica hidraulica iluminacao
+moveis armario mesa cadeira sofa tapete cortina janela porta piso parede
+campanha anuncio redes sociais video foto design logotipo marca identidade
+estrategia meta indicador resultado trimestre semestre mensal semanal diario
+'''.split()
+
+HEAVY_WORD = 'projeto'  # palavra mais frequente
+RARE_WORD = 'xilofone'  # aparece em poucos projetos
+
+
+def sentence(rng, weights, size):
+    return ' '.join(rng.choices(WORDS, weights, k=size))
+
+
+def seed(conn, users, projects, rng):
+    """Usuarios e projetos em lotes (pelo SQL, sem passar pela API)"""
+    weights = [1 / (rank + 1) for rank in range(len(WORDS))]
+    conn.execute('BEGIN')
+    conn.executemany(
+        'INSERT INTO users (username, email, password) VALUES (?, ?, ?)',
+        ((f'user{i}', f'user{i}@bench.com', basic_server.hash_password('bench123'))
+         for i in range(users))
+    )
+
+    def rows():
+        for user_id in range(1, users + 1):
+            for i in range(projects):
+                texto = sentence(rng, weights, rng.randint(2, 5))
+                if rng.random() < 0.001:
+                    texto += f' {RARE_WORD}'
+                yield (user_id, texto.capitalize(), sentence(rng, weights, rng.randint(6, 14)),
+                       'medium', 0, i + 1)
+
+    conn.executemany('''
+        INSERT INTO projects (user_id, texto, description, priority, pinned, order_index)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', rows())
+    conn.execute('COMMIT')
+
+
+def measure(fn, repeat):
+    """Executa `fn` `repeat` vezes e retorna tempos em ms"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+def report(label, times, extra=''):
+    times = sorted(times)
+    p95 = times[max(0, int(len(times) * 0.95) - 1)]
+    print(f"  {label:<34} p50 {statistics.median(times):9.2f} ms   p95 {p95:9.2f} ms  {extra}")
+
+
+def measure_create(conn, repeat):
+    def create():
+        conn.execute('BEGIN')
+        conn.execute('''
+            INSERT INTO projects (user_id, texto, description, priority, pinned, order_index)
+            VALUES (1, 'Projeto do benchmark', 'descricao curta do projeto', 'medium', 0, 0)
+        ''')
+        conn.execute('COMMIT')
+    report('criar projeto', measure(create, repeat))
+
+
+class QuietHandler(basic_server.ProjectHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark da busca FTS5 do basic_server.py')
+    parser.add_argument('--projects', type=int, default=100_000, help='projetos por usuario')
+    parser.add_argument('--users', type=int, default=3)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        conn = sqlite3.connect(db_path, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        fts_version = next(v for v, description, _ in basic_server.MIGRATIONS if 'FTS5' in description)
+        basic_server.apply_migrations(conn, target=fts_version - 1)
+
+        start = time.perf_counter()
+        seed(conn, args.users, args.projects, random.Random(args.seed))
+        total = args.users * args.projects
+        print(f"{total} projetos ({args.users} usuarios x {args.projects}) populados em "
+              f"{time.perf_counter() - start:.1f} s")
+
+        print("\nSem FTS5:")
+        measure_create(conn, args.repeat)
+
+        start = time.perf_counter()
+        basic_server.apply_migrations(conn)
+        print(f"\nIndice FTS5 criado em {time.perf_counter() - start:.1f} s "
+              f"(banco com {os.path.getsize(db_path) / 2**20:.0f} MB)")
+        print("\nCom FTS5 (triggers):")
+        measure_create(conn, args.repeat)
+        conn.close()
+
+        basic_server.DB_NAME = db_path
+        basic_server.db_pool = basic_server.ConnectionPool(db_path, size=4)
+        server = basic_server.create_server(('127.0.0.1', 0), 'threaded', 4, 16, handler_class=QuietHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        client = http.client.HTTPConnection('127.0.0.1', server.server_address[1], timeout=120)
+
+        def get(path, token=None):
+            client.request('GET', path, headers={'Authorization': f'Bearer {token}'} if token else {})
+            response = client.getresponse()
+            return response.status, response.read()
+
+        body = json.dumps({'email': 'user0@bench.com', 'password': 'bench123'})
+        client.request('POST', '/api/login', body=body, headers={'Content-Type': 'application/json'})
+        token = json.loads(client.getresponse().read())['token']
+
+        print(f"\nBusca pelo endpoint (usuario com {args.projects} projetos):")
+        queries = [
+            ('termo frequente', {'q': HEAVY_WORD}),
+            ('termo raro', {'q': RARE_WORD}),
+            ('prefixo de 2 letras', {'q': 're'}),
+            ('prefixo de 4 letras', {'q': 'plan'}),
+            ('dois termos', {'q': 'relatorio vendas'}),
+            ('tres termos', {'q': 'reforma cozinha orcamento'}),
+            ('termo frequente, offset 1000', {'q': HEAVY_WORD, 'offset': 1000}),
+        ]
+        for label, params in queries:
+            path = '/api/lists/search?' + urllib.parse.urlencode(params)
+            status, payload = get(path, token)
+            assert status == 200, payload[:200]
+            found = len(json.loads(payload)['items'])
+            report(label, measure(lambda: get(path, token), args.repeat), f'({found} na pagina)')
+
+        # Caminho antigo: lista completa + filtro no cliente
+        def download_and_filter():
+            status, payload = get('/api/lists', token)
+            items = json.loads(payload)['items']
+            return [item for item in items
+                    if HEAVY_WORD in item['texto'].lower() or HEAVY_WORD in (item['description'] or '').lower()]
+
+        print("\nSem busca no servidor:")
+        report('baixar lista inteira e filtrar', measure(download_and_filter, max(3, args.repeat // 10)))
+
+        client.close()
+        server.shutdown()
+        server.server_close()
+        basic_server.db_pool.close_all()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark de escritas concorrentes por numero de shards do basic_server.py
+
+Para cada quantidade de shards cria um banco temporario com `--users`
+usuarios e dispara `--writers` processos (como os workers do modo prefork),
+cada um com seus proprios usuarios, repetindo as escritas dos handlers:
+criar projeto, editar o texto e mover. Com um arquivo so todos disputam o
+mesmo lock de escrita do SQLite; com N shards a disputa cai para os
+processos cujos usuarios caem no mesmo arquivo.
+
+`--synchronous FULL` faz um fsync por commit (lock segurado por mais
+tempo), o caso em que a disputa mais pesa.
+
+Uso:
+    python scripts/bench_shards.py --shards 0 2 4 8 --writers 8 --seconds 5
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import basic_server  # noqa: E402
+
+
+def create(conn, user_id, rng):
+    """Mesmo SQL de handle_create_project"""
+    cursor = conn.cursor()
+    cursor.execute('SELECT MAX(order_index) FROM projects WHERE user_id = ?', (user_id,))
+    max_order = cursor.fetchone()[0] or 0
+    cursor.execute('''
+        INSERT INTO projects (user_id, texto, description, priority, image_key, pinned, order_index)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', (user_id, f'Projeto {rng.random():.6f}', 'descricao do benchmark', 'medium', None, 0, max_order + 1))
+    basic_server.bump_projects_version(conn, user_id)
+    conn.commit()
+    return cursor.lastrowid
+
+
+def update(conn, user_id, project_id, rng):
+    conn.execute('UPDATE projects SET texto = ? WHERE id = ? AND user_id = ?',
+                 (f'Editado {rng.random():.6f}', project_id, user_id))
+    basic_server.bump_projects_version(conn, user_id)
+    conn.commit()
+
+
+def move(conn, user_id, project_id, rng):
+    conn.execute('UPDATE projects SET order_index = ? WHERE id = ? AND user_id = ?',
+                 (rng.random() * 1000, project_id, user_id))
+    basic_server.bump_projects_version(conn, user_id)
+    conn.commit()
+
+
+def writer(db_name, shard_dir, shard_count, user_ids, synchronous, start_at, seconds, results):
+    """Processo escritor: roda ate o fim da janela e devolve as latencias"""
+    basic_server.db_pool = basic_server.ConnectionPool(db_name, size=1)
+    shards = basic_server.ProjectShards(shard_count, shard_dir, pool_size=1)
+    rng = random.Random(user_ids[0])
+    created = {user_id: [] for user_id in user_ids}
+    latencies = []
+    busy = 0
+
+    time.sleep(max(0, start_at - time.time()))
+    stop_at = start_at + seconds
+    step = 0
+    while time.time() < stop_at:
+        user_id = user_ids[step % len(user_ids)]
+        start = time.perf_counter()
+        try:
+            with shards.connection(user_id) as conn:
+                conn.execute(f'PRAGMA synchronous={synchronous}')
+                if step % 3 == 0 or not created[user_id]:
+                    created[user_id].append(create(conn, user_id, rng))
+                elif step % 3 == 1:
+                    update(conn, user_id, rng.choice(created[user_id]), rng)
+                else:
+                    move(conn, user_id, rng.choice(created[user_id]), rng)
+            latencies.append((time.perf_counter() - start) * 1000)
+        except sqlite3.OperationalError:
+            # Lock nao obtido dentro de DB_BUSY_TIMEOUT
+            busy += 1
+        step += 1
+    shards.close_all()
+    basic_server.db_pool.close_all()
+    results.put((latencies, busy))
+
+
+def run_round(ctx, shard_count, args):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_name = os.path.join(tmp, 'bench.db')
+        shard_dir = os.path.join(tmp, 'shards')
+        basic_server.init_storage(shard_count, shard_dir, db_name)
+        conn = sqlite3.connect(db_name)
+        conn.executemany('INSERT INTO users (username, email, password) VALUES (?, ?, ?)',
+                         ((f'user{i}', f'user{i}@bench.com', 'x') for i in range(args.users)))
+        conn.commit()
+        conn.close()
+
+        # Usuarios distintos por processo: a disputa e so pelo arquivo
+        users = list(range(1, args.users + 1))
+        results = ctx.Queue()
+        start_at = time.time() + 1.5
+        processes = [
+            ctx.Process(target=writer, args=(db_name, shard_dir, shard_count, users[i::args.writers],
+                                             args.synchronous, start_at, args.seconds, results))
+            for i in range(args.writers)
+        ]
+        for process in processes:
+            process.start()
+        latencies, busy = [], 0
+        for _ in processes:
+            local, local_busy = results.get()
+            latencies.extend(local)
+            busy += local_busy
+        for process in processes:
+            process.join()
+
+    latencies.sort()
+    p99 = latencies[max(0, int(len(latencies) * 0.99) - 1)] if latencies else 0
+    label = str(shard_count) if shard_count else '0 (1 arquivo)'
+    print(f"{label:<16}{len(latencies) / args.seconds:>10.0f}"
+          f"{statistics.median(latencies) if latencies else 0:>10.2f}{p99:>10.2f}{busy:>12}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de escritas concorrentes por numero de shards')
+    parser.add_argument('--shards', type=int, nargs='+', default=[0, 2, 4, 8])
+    parser.add_argument('--writers', type=int, default=8, help='processos escrevendo ao mesmo tempo')
+    parser.add_argument('--users', type=int, default=64)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--synchronous', choices=['NORMAL', 'FULL'], default='NORMAL',
+                        help='NORMAL e o padrao do servidor; FULL faz fsync a cada commit')
+    args = parser.parse_args()
+    if args.users < args.writers:
+        parser.error('--users precisa ser >= --writers')
+
+    ctx = multiprocessing.get_context('spawn')
+    print(f"{args.writers} processos x {args.seconds:g} s (criar/editar/mover, synchronous={args.synchronous})")
+    print(f"{'shards':<16}{'escr/s':>10}{'p50 (ms)':>10}{'p99 (ms)':>10}{'bloqueios':>12}")
+    for shard_count in args.shards:
+        run_round(ctx, shard_count, args)
+
+
+if __name__ == '__main__':
+    main()
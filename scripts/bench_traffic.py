@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark de trafego misto do basic_server.py
+
+Sobe o servidor em uma porta livre com banco e pasta de imagens temporarios,
+um stub local do ViaCEP, cadastra `--users` usuarios e popula `--projects`
+projetos (parte com imagem). Depois `--clients` clientes, cada um com sua
+conexao keep-alive e seu grupo de usuarios, repetem uma mistura de operacoes
+parecida com o uso do front: listar, criar, editar, mover, reordenar,
+excluir, login, cadastro, CEP e imagens.
+
+Ao final mostra vazao e latencia p50/p95/p99 por endpoint. `--save` grava o
+resultado em JSON e `--compare` compara com um resultado salvo antes,
+saindo com codigo 1 se algum endpoint piorou mais que `--tolerance`.
+
+Uso:
+    python scripts/bench_traffic.py --requests 5000 --save baseline.json
+    python scripts/bench_traffic.py --requests 5000 --compare baseline.json
+"""
+
+import argparse
+import base64
+import http.client
+import http.server
+import json
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import basic_server  # noqa: E402
+
+# Peso de cada operacao na mistura (proporcional)
+WORKLOAD = {
+    'list': 35,
+    'create': 10,
+    'patch': 10,
+    'update': 5,
+    'move': 10,
+    'reorder': 3,
+    'delete': 7,
+    'login': 4,
+    'register': 1,
+    'cep': 10,
+    'image': 5,
+}
+
+PASSWORD = 'bench123'
+
+
+class QuietHandler(basic_server.ProjectHandler):
+    def log_message(self, format, *args):
+        # Log de acesso no stderr distorce a medicao
+        pass
+
+
+class ViaCepStub(http.server.BaseHTTPRequestHandler):
+    """ViaCEP local: CEPs terminados em 99 nao existem"""
+    delay = 0.0
+
+    def do_GET(self):
+        time.sleep(self.delay)
+        cep = self.path.strip('/').split('/')[-2] if self.path.endswith('/json/') else ''
+        if cep.endswith('99'):
+            body = {'erro': True}
+        else:
+            body = {'cep': f'{cep[:5]}-{cep[5:]}', 'logradouro': 'Rua do Benchmark',
+                    'bairro': 'Centro', 'localidade': 'Sao Paulo', 'uf': 'SP'}
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Client:
+    """Conexao keep-alive que reconecta quando o servidor fecha"""
+
+    def __init__(self, port):
+        self.port = port
+        self.conn = None
+
+    def request(self, method, path, body=None, token=None):
+        headers = {}
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        data = None
+        if body is not None:
+            data = json.dumps(body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        for attempt in range(2):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=30)
+            try:
+                self.conn.request(method, path, body=data, headers=headers)
+                response = self.conn.getresponse()
+                payload = response.read()
+            except (http.client.HTTPException, OSError):
+                # Conexao keep-alive encerrada pelo servidor (timeout ou limite)
+                self.conn.close()
+                self.conn = None
+                if attempt:
+                    raise
+                continue
+            if response.will_close:
+                self.conn.close()
+                self.conn = None
+            return response.status, payload
+
+
+def seed(port, db_path, args, rng):
+    """Cadastra usuarios pela API e insere projetos direto no banco"""
+    client = Client(port)
+    users = []
+    for i in range(args.users):
+        email = f'user{i}@bench.com'
+        status, payload = client.request('POST', '/api/register',
+                                         {'username': f'user{i}', 'email': email, 'password': PASSWORD})
+        if status != 200:
+            raise SystemExit(f'Falha ao cadastrar usuario de teste: {status} {payload[:200]}')
+        data = json.loads(payload)
+        users.append({'id': data['user']['id'], 'email': email, 'token': data['token'], 'projects': []})
+
+    # Poucas imagens distintas: o armazenamento deduplica pelo hash
+    image_keys = [basic_server.image_store.put(os.urandom(args.image_bytes), 'image/png') for _ in range(8)]
+
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    conn.execute('BEGIN')
+    order = {user['id']: 0 for user in users}
+    rows = []
+    for i in range(args.projects):
+        user = users[i % len(users)]
+        order[user['id']] += 1
+        image_key = rng.choice(image_keys) if rng.random() < args.image_ratio else None
+        rows.append((user['id'], f'Projeto {i}', 'descricao do benchmark', 'medium', '',
+                     image_key, 0, order[user['id']]))
+    conn.executemany('''
+        INSERT INTO projects (user_id, texto, description, priority, image_path, image_key, pinned, order_index)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', rows)
+    conn.execute('COMMIT')
+    by_user = {user['id']: user for user in users}
+    for project_id, user_id in conn.execute('SELECT id, user_id FROM projects ORDER BY order_index'):
+        by_user[user_id]['projects'].append(project_id)
+    conn.close()
+    return users, image_keys
+
+
+def run_client(port, users, image_keys, count, seed_value, results, lock, args):
+    """Executa `count` operacoes sorteadas sobre os usuarios deste cliente"""
+    rng = random.Random(seed_value)
+    client = Client(port)
+    operations = list(WORKLOAD)
+    weights = [WORKLOAD[name] for name in operations]
+    small_image = 'data:image/png;base64,' + base64.b64encode(os.urandom(2048)).decode('ascii')
+    local = {}
+
+    def timed(label, method, path, body=None, token=None, expected=(200,)):
+        start = time.perf_counter()
+        status, payload = client.request(method, path, body, token)
+        elapsed = (time.perf_counter() - start) * 1000
+        times, errors = local.setdefault(label, ([], [0]))
+        times.append(elapsed)
+        if status not in expected:
+            errors[0] += 1
+        return status, payload
+
+    for n in range(count):
+        user = rng.choice(users)
+        token = user['token']
+        projects = user['projects']
+        operation = rng.choices(operations, weights)[0]
+        # Sem projetos suficientes a operacao vira uma criacao
+        if operation in ('patch', 'update', 'delete', 'image') and not projects:
+            operation = 'create'
+        if operation in ('move', 'reorder') and len(projects) < 2:
+            operation = 'create'
+
+        if operation == 'list':
+            timed('GET /api/lists', 'GET', f'/api/lists?limit={args.page_size}', token=token)
+        elif operation == 'create':
+            body = {'texto': f'Novo projeto {n}', 'description': 'criado no benchmark', 'priority': 'high'}
+            if rng.random() < args.image_ratio:
+                body['image_path'] = small_image
+            status, payload = timed('POST /api/lists', 'POST', '/api/lists', body, token)
+            if status == 200:
+                projects.append(json.loads(payload)['id'])
+        elif operation == 'patch':
+            project_id = rng.choice(projects)
+            timed('PATCH /api/lists/{id}', 'PATCH', f'/api/lists/{project_id}',
+                  {'texto': f'Editado {n}'}, token)
+        elif operation == 'update':
+            project_id = rng.choice(projects)
+            timed('PUT /api/lists/{id}', 'PUT', f'/api/lists/{project_id}',
+                  {'texto': f'Atualizado {n}', 'description': 'put completo', 'priority': 'low',
+                   'image_path': '', 'pinned': False}, token)
+        elif operation == 'move':
+            project_id, neighbour = rng.sample(projects, 2)
+            side = rng.choice(('after', 'before'))
+            timed('POST /api/lists/{id}/move', 'POST', f'/api/lists/{project_id}/move',
+                  {side: neighbour}, token)
+        elif operation == 'reorder':
+            # Como o front antigo: envia a ordem de um trecho da lista
+            window = projects[:args.page_size]
+            order = window[:]
+            rng.shuffle(order)
+            timed('PUT /api/lists/reorder', 'PUT', '/api/lists/reorder', {'order': order}, token)
+        elif operation == 'delete':
+            project_id = projects.pop(rng.randrange(len(projects)))
+            timed('DELETE /api/lists/{id}', 'DELETE', f'/api/lists/{project_id}', token=token)
+        elif operation == 'login':
+            timed('POST /api/login', 'POST', '/api/login', {'email': user['email'], 'password': PASSWORD})
+        elif operation == 'register':
+            name = f'novo{seed_value}x{n}'
+            timed('POST /api/register', 'POST', '/api/register',
+                  {'username': name, 'email': f'{name}@bench.com', 'password': PASSWORD})
+        elif operation == 'cep':
+            cep = f'{rng.randrange(args.ceps):08d}'
+            timed('GET /api/cep/{cep}', 'GET', f'/api/cep/{cep}', token=token, expected=(200, 404))
+        elif operation == 'image':
+            timed('GET /api/images/{key}', 'GET', basic_server.image_url(rng.choice(image_keys)))
+
+    with lock:
+        for label, (times, errors) in local.items():
+            entry = results.setdefault(label, ([], [0]))
+            entry[0].extend(times)
+            entry[1][0] += errors[0]
+
+
+def percentile(sorted_times, fraction):
+    index = max(0, min(len(sorted_times) - 1, int(round(fraction * len(sorted_times))) - 1))
+    return sorted_times[index]
+
+
+def summarize(results, elapsed):
+    """Estatisticas por endpoint e total"""
+    def stats(times, errors):
+        times = sorted(times)
+        return {
+            'requests': len(times),
+            'errors': errors,
+            'throughput': round(len(times) / elapsed, 1),
+            'p50_ms': round(percentile(times, 0.50), 3),
+            'p95_ms': round(percentile(times, 0.95), 3),
+            'p99_ms': round(percentile(times, 0.99), 3),
+        }
+
+    endpoints = {label: stats(times, errors[0]) for label, (times, errors) in sorted(results.items())}
+    all_times = [t for times, _ in results.values() for t in times]
+    total = stats(all_times, sum(errors[0] for _, errors in results.values()))
+    return endpoints, total
+
+
+def print_table(endpoints, total):
+    print(f"{'endpoint':<30}{'reqs':>7}{'erros':>7}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for label, row in list(endpoints.items()) + [('TOTAL', total)]:
+        print(f"{label:<30}{row['requests']:>7}{row['errors']:>7}{row['throughput']:>9.1f}"
+              f"{row['p50_ms']:>9.2f}{row['p95_ms']:>9.2f}{row['p99_ms']:>9.2f}")
+
+
+def compare(result, baseline_path, tolerance):
+    """Compara p95 e vazao com um resultado salvo; retorna True se houve regressao"""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressed = False
+    print(f"\nComparacao com {baseline_path} (tolerancia {tolerance:.0%}):")
+    rows = list(result['endpoints'].items()) + [('TOTAL', result['total'])]
+    for label, row in rows:
+        old = baseline['total'] if label == 'TOTAL' else baseline['endpoints'].get(label)
+        if not old:
+            continue
+        p95_change = row['p95_ms'] / old['p95_ms'] - 1 if old['p95_ms'] else 0
+        rate_change = row['throughput'] / old['throughput'] - 1 if old['throughput'] else 0
+        # Vazao por endpoint depende da mistura sorteada: so o total conta
+        bad = p95_change > tolerance or (label == 'TOTAL' and rate_change < -tolerance)
+        regressed = regressed or bad
+        print(f"  {label:<30} p95 {p95_change:+7.1%}   req/s {rate_change:+7.1%}{'   REGRESSAO' if bad else ''}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de trafego misto do basic_server.py')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--projects', type=int, default=20000, help='projetos iniciais (divididos entre usuarios)')
+    parser.add_argument('--image-ratio', type=float, default=0.1, help='fracao de projetos com imagem')
+    parser.add_argument('--image-bytes', type=int, default=64 * 1024)
+    parser.add_argument('--requests', type=int, default=5000, help='total de requisicoes da mistura')
+    parser.add_argument('--clients', type=int, default=8, help='clientes concorrentes')
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--page-size', type=int, default=50)
+    parser.add_argument('--ceps', type=int, default=500, help='CEPs distintos sorteados')
+    parser.add_argument('--cep-delay', type=float, default=0.02, help='latencia do stub do ViaCEP (s)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--save', help='grava o resultado em JSON')
+    parser.add_argument('--compare', help='JSON salvo antes para detectar regressoes')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='piora aceita no p95/vazao')
+    args = parser.parse_args()
+    args.users = max(args.users, args.clients)
+    rng = random.Random(args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        basic_server.init_db(db_path)
+        basic_server.DB_NAME = db_path
+        basic_server.db_pool = basic_server.ConnectionPool(db_path, size=args.workers)
+        basic_server.image_store = basic_server.ImageStore(os.path.join(tmp, 'uploads'))
+
+        ViaCepStub.delay = args.cep_delay
+        stub = http.server.ThreadingHTTPServer(('127.0.0.1', 0), ViaCepStub)
+        threading.Thread(target=stub.serve_forever, daemon=True).start()
+        basic_server.cep_resolver = basic_server.CepResolver(
+            f'http://127.0.0.1:{stub.server_address[1]}/ws/{{cep}}/json/')
+
+        server = basic_server.create_server(('127.0.0.1', 0), 'threaded', args.workers,
+                                            queue_size=args.clients * 4, handler_class=QuietHandler)
+        port = server.server_address[1]
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        start = time.perf_counter()
+        users, image_keys = seed(port, db_path, args, rng)
+        print(f"{len(users)} usuarios e {args.projects} projetos populados em {time.perf_counter() - start:.1f} s")
+
+        # Cada cliente fica com um grupo de usuarios: sem corrida entre excluir e editar
+        groups = [users[i::args.clients] for i in range(args.clients)]
+        per_client = args.requests // args.clients
+        results = {}
+        lock = threading.Lock()
+        threads = [threading.Thread(target=run_client,
+                                    args=(port, group, image_keys, per_client, args.seed + i, results, lock, args))
+                   for i, group in enumerate(groups)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        server.shutdown()
+        server.server_close()
+        stub.shutdown()
+        basic_server.db_pool.close_all()
+
+    endpoints, total = summarize(results, elapsed)
+    print(f"\n{args.clients} clientes, {total['requests']} requisicoes em {elapsed:.1f} s\n")
+    print_table(endpoints, total)
+
+    result = {
+        'config': {key: value for key, value in vars(args).items() if key not in ('save', 'compare')},
+        'environment': {
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+        },
+        'elapsed_s': round(elapsed, 3),
+        'endpoints': endpoints,
+        'total': total,
+    }
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+        print(f"\nResultado salvo em {args.save}")
+    if args.compare and compare(result, args.compare, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
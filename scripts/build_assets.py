@@ -0,0 +1,467 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Build do front-end do basic_server.py
+
+Le os arquivos fonte (nunca os altera) e grava em `--out` (padrao: dist/):
+
+- assets (`style.css`, `js/auth.js`): sem console.log/debug/info, minificados
+  e com o hash do conteudo no nome (`assets/auth.<hash>.js`); o servidor os
+  entrega com `Cache-Control: immutable`
+- paginas (`index.html`, `lista.html`): JS e CSS inline minificados, sem
+  comentarios HTML nem indentacao, e com as referencias aos assets trocadas
+  pelos nomes com hash; continuam com o mesmo nome e sao revalidadas
+- `manifest.json`: qual arquivo do build corresponde a cada fonte
+
+O build e incremental: arquivo cujo fonte (e, nas paginas, os nomes dos
+assets referenciados) nao mudou desde o ultimo build nao e reprocessado.
+Alterar este script invalida tudo.
+
+A minificacao de JS e conservadora: remove comentarios e espacos, mas mantem
+as quebras de linha que podem ter efeito (insercao automatica de ponto e
+virgula) e nao renomeia nada.
+
+Uso:
+    python scripts/build_assets.py
+    python scripts/build_assets.py --force   # reprocessa tudo
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import posixpath
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import basic_server  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ASSETS = ('style.css', 'js/auth.js')  # ganham hash no nome
+PAGES = ('index.html', 'lista.html')  # mantem o nome (entrada do site)
+ASSETS_DIR = 'assets'
+HASH_LENGTH = 10
+STRIP_CONSOLE = ('log', 'debug', 'info')  # chamadas console.<metodo>(...) removidas
+
+JS_WORD_RE = re.compile(r'[\w$\u0080-\uffff]')
+# Depois dessas palavras uma / comeca uma regex, nao uma divisao
+REGEX_AFTER_WORDS = {'return', 'typeof', 'instanceof', 'in', 'of', 'new', 'delete', 'void',
+                     'throw', 'case', 'do', 'else', 'yield', 'await'}
+
+
+def is_word_char(char):
+    return bool(JS_WORD_RE.match(char))
+
+
+def scan_quoted(source, start, quote):
+    """Fim (exclusivo) da string que comeca em `start`"""
+    i = start + 1
+    while i < len(source):
+        char = source[i]
+        if char == '\\':
+            i += 2
+            continue
+        if char == quote:
+            return i + 1
+        if char == '\n':
+            break
+        i += 1
+    raise ValueError(f'String nao fechada na posicao {start}')
+
+
+def scan_regex(source, start):
+    """Fim (exclusivo) da regex literal que comeca em `start`, com as flags"""
+    i = start + 1
+    in_class = False
+    while i < len(source):
+        char = source[i]
+        if char == '\\':
+            i += 2
+            continue
+        if char == '\n':
+            break
+        if char == '[':
+            in_class = True
+        elif char == ']':
+            in_class = False
+        elif char == '/' and not in_class:
+            i += 1
+            while i < len(source) and is_word_char(source[i]):
+                i += 1
+            return i
+        i += 1
+    raise ValueError(f'Regex nao fechada na posicao {start}')
+
+
+def regex_allowed(previous):
+    """Uma / depois do token `previous` comeca uma regex?"""
+    if previous is None:
+        return True
+    kind, text = previous
+    if kind == 'punct':
+        return text not in ')]}'
+    if kind == 'word':
+        return text in REGEX_AFTER_WORDS
+    return False
+
+
+def js_tokens(source):
+    """Divide o JS em (tipo, texto): space, comment, string, regex, word ou punct
+
+    Strings, templates e regex sao tokens inteiros; o codigo dentro de ${...}
+    de um template e tokenizado normalmente.
+    """
+    tokens = []
+    braces = []  # '{' de bloco/objeto ou '`' de uma substituicao ${...}
+    previous = None  # ultimo token significativo
+    i = 0
+    while i < len(source):
+        char = source[i]
+        if char.isspace():
+            j = i
+            while j < len(source) and source[j].isspace():
+                j += 1
+            tokens.append(('space', source[i:j]))
+            i = j
+            continue
+        if source.startswith('//', i):
+            j = source.find('\n', i)
+            j = len(source) if j < 0 else j
+            tokens.append(('comment', source[i:j]))
+            i = j
+            continue
+        if source.startswith('/*', i):
+            j = source.find('*/', i + 2)
+            if j < 0:
+                raise ValueError(f'Comentario nao fechado na posicao {i}')
+            tokens.append(('comment', source[i:j + 2]))
+            i = j + 2
+            continue
+
+        if char in '\'"':
+            j = scan_quoted(source, i, char)
+            token = ('string', source[i:j])
+        elif char == '`' or (char == '}' and braces and braces[-1] == '`'):
+            if char == '}':
+                braces.pop()
+            j = i + 1
+            while True:
+                if j >= len(source):
+                    raise ValueError(f'Template nao fechado na posicao {i}')
+                if source[j] == '\\':
+                    j += 2
+                elif source[j] == '`':
+                    j += 1
+                    break
+                elif source.startswith('${', j):
+                    j += 2
+                    braces.append('`')
+                    break
+                else:
+                    j += 1
+            token = ('string', source[i:j])
+        elif char == '/' and regex_allowed(previous):
+            j = scan_regex(source, i)
+            token = ('regex', source[i:j])
+        elif is_word_char(char):
+            j = i
+            while j < len(source) and is_word_char(source[j]):
+                j += 1
+            token = ('word', source[i:j])
+        else:
+            if char == '{':
+                braces.append('{')
+            elif char == '}' and braces:
+                braces.pop()
+            j = i + 1
+            token = ('punct', char)
+        tokens.append(token)
+        previous = token
+        i = j
+    return tokens
+
+
+def significant(tokens, start, step=1):
+    """Indice do proximo token que nao e espaco/comentario (ou None)"""
+    i = start
+    while 0 <= i < len(tokens):
+        if tokens[i][0] not in ('space', 'comment'):
+            return i
+        i += step
+    return None
+
+
+def strip_console(tokens, methods=STRIP_CONSOLE):
+    """Remove as chamadas console.<metodo>(...)
+
+    Uma chamada que e o comando inteiro sai junto com o `;`; em qualquer
+    outra posicao (ex.: `.catch(e => console.log(e))`) vira `void 0`.
+    """
+    out = []
+    i = 0
+    while i < len(tokens):
+        kind, text = tokens[i]
+        if kind == 'word' and text == 'console':
+            before = significant(out, len(out) - 1, -1)
+            dot = significant(tokens, i + 1)
+            name = dot is not None and significant(tokens, dot + 1)
+            paren = name and significant(tokens, name + 1)
+            if ((before is None or out[before] != ('punct', '.'))
+                    and dot is not None and tokens[dot] == ('punct', '.')
+                    and name and tokens[name][0] == 'word' and tokens[name][1] in methods
+                    and paren and tokens[paren] == ('punct', '(')):
+                depth = 0
+                end = paren
+                while end < len(tokens):
+                    if tokens[end] == ('punct', '('):
+                        depth += 1
+                    elif tokens[end] == ('punct', ')'):
+                        depth -= 1
+                        if depth == 0:
+                            break
+                    end += 1
+                after = significant(tokens, end + 1)
+                statement_start = before is None or out[before][1] in (';', '{', '}')
+                if statement_start and after is not None and tokens[after] == ('punct', ';'):
+                    i = after + 1
+                else:
+                    out.extend([('word', 'void'), ('space', ' '), ('word', '0')])
+                    i = end + 1
+                continue
+        out.append(tokens[i])
+        i += 1
+    return out
+
+
+def needs_space(before, after):
+    """Espaco obrigatorio entre dois caracteres vizinhos na saida"""
+    return ((is_word_char(before) and is_word_char(after))
+            or (before == after and before in '+-')
+            or (before == '/' and after in '/*')
+            or (before.isdigit() and after == '.')
+            or (before == '<' and after == '!'))
+
+
+def minify_js(source, strip=STRIP_CONSOLE):
+    """JS sem comentarios, indentacao e espacos desnecessarios"""
+    tokens = strip_console(js_tokens(source), strip) if strip else js_tokens(source)
+    out = []
+    gap = None  # separador pendente: None, ' ' ou '\n'
+    for kind, text in tokens:
+        if kind in ('space', 'comment'):
+            if '\n' in text or text.startswith('//'):
+                gap = '\n'
+            elif gap is None:
+                gap = ' '
+            continue
+        if gap and out:
+            before, after = out[-1][-1], text[0]
+            # Quebra de linha so importa onde pode haver insercao de ponto e virgula
+            if gap == '\n' and before not in '{;,([' and after not in ')]},;':
+                out.append('\n')
+            elif needs_space(before, after):
+                out.append(' ')
+        gap = None
+        out.append(text)
+    return ''.join(out)
+
+
+CSS_PROTECTED_RE = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|/\*.*?\*/)', re.S)
+
+
+def minify_css(source):
+    """CSS sem comentarios e espacos desnecessarios (strings preservadas)"""
+    parts = []
+    code = []
+    for i, piece in enumerate(CSS_PROTECTED_RE.split(source)):
+        if i % 2 and not piece.startswith('/*'):
+            parts.append(('code', ''.join(code)))
+            parts.append(('string', piece))
+            code = []
+        else:
+            code.append(' ' if i % 2 else piece)
+    parts.append(('code', ''.join(code)))
+
+    out = []
+    for kind, text in parts:
+        if kind == 'code':
+            text = re.sub(r'\s+', ' ', text)
+            text = re.sub(r'\s*([{};,>])\s*', r'\1', text)
+            # Antes de ':' o espaco fica: em seletor `a :hover` e diferente de `a:hover`
+            text = re.sub(r':\s+', ':', text)
+            text = text.replace(';}', '}')
+        out.append(text)
+    return ''.join(out).strip()
+
+
+HTML_RAW_RE = re.compile(r'(<(script|style|pre|textarea)\b[^>]*>)(.*?)(</\2\s*>)', re.S | re.I)
+HTML_COMMENT_RE = re.compile(r'<!--(?!\[if).*?-->', re.S)
+HTML_REF_RE = re.compile(r'\b(src|href)=(["\'])([^"\']*)\2', re.I)
+SCRIPT_SRC_RE = re.compile(r'\bsrc=', re.I)
+SCRIPT_TYPE_RE = re.compile(r'\btype=(["\'])(.*?)\1', re.I)
+JS_TYPES = ('', 'text/javascript', 'application/javascript', 'module')
+
+
+def ref_source(url, page_dir):
+    """Arquivo fonte local apontado por um src/href (None se externo)"""
+    path = url.split('#')[0].split('?')[0]
+    if not path or '//' in url or ':' in path:
+        return None
+    if path.startswith('/'):
+        return path.lstrip('/')
+    return posixpath.normpath(posixpath.join(page_dir, path))
+
+
+def referenced_assets(html, page):
+    """Fontes locais referenciados pela pagina"""
+    page_dir = posixpath.dirname(page)
+    return {ref_source(match.group(3), page_dir) for match in HTML_REF_RE.finditer(html)} - {None}
+
+
+def rewrite_refs(html, page, assets):
+    """Troca src/href que apontam para um asset pelo nome com hash"""
+    page_dir = posixpath.dirname(page)
+
+    def replace(match):
+        source = ref_source(match.group(3), page_dir)
+        if source not in assets:
+            return match.group(0)
+        new = posixpath.relpath(assets[source], page_dir or '.')
+        return f'{match.group(1)}={match.group(2)}{new}{match.group(2)}'
+
+    return HTML_REF_RE.sub(replace, html)
+
+
+def minify_markup(html):
+    """HTML sem comentarios, indentacao e linhas vazias"""
+    html = HTML_COMMENT_RE.sub('', html)
+    return '\n'.join(line.strip() for line in html.splitlines() if line.strip())
+
+
+def build_page(source, page, assets):
+    """Pagina com JS/CSS inline minificados e referencias aos assets com hash"""
+    out = []
+    position = 0
+    for match in HTML_RAW_RE.finditer(source):
+        out.append(minify_markup(rewrite_refs(source[position:match.start()], page, assets)))
+        opening, tag, content, closing = match.group(1), match.group(2).lower(), match.group(3), match.group(4)
+        if tag == 'script' and not SCRIPT_SRC_RE.search(opening):
+            script_type = SCRIPT_TYPE_RE.search(opening)
+            if (script_type.group(2).lower() if script_type else '') in JS_TYPES:
+                content = minify_js(content)
+        elif tag == 'style':
+            content = minify_css(content)
+        out.append(rewrite_refs(opening, page, assets) + content + closing)
+        position = match.end()
+    out.append(minify_markup(rewrite_refs(source[position:], page, assets)))
+    return '\n'.join(part for part in out if part)
+
+
+def build_asset(source, name):
+    if name.endswith('.js'):
+        return minify_js(source)
+    if name.endswith('.css'):
+        return minify_css(source)
+    return source
+
+
+def hashed_name(name, data):
+    """assets/<nome>.<hash>.<ext>"""
+    stem, ext = posixpath.splitext(posixpath.basename(name))
+    digest = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+    return posixpath.join(ASSETS_DIR, f'{stem}.{digest}{ext}')
+
+
+def write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp = path + '.tmp'
+    with open(temp, 'wb') as f:
+        f.write(data)
+    os.replace(temp, path)
+
+
+def load_manifest(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build do front-end (minificacao e nomes com hash)')
+    parser.add_argument('--out', default=basic_server.BUILD_DIR, help='diretorio de saida')
+    parser.add_argument('--force', action='store_true', help='reprocessa todos os arquivos')
+    args = parser.parse_args()
+
+    out_dir = os.path.join(ROOT, args.out) if not os.path.isabs(args.out) else args.out
+    manifest_path = os.path.join(out_dir, basic_server.BUILD_MANIFEST)
+    old = load_manifest(manifest_path)
+    with open(os.path.abspath(__file__), 'rb') as f:
+        builder = hashlib.sha256(f.read()).hexdigest()[:HASH_LENGTH]
+    previous = old if not args.force and old.get('builder') == builder else {}
+
+    start = time.perf_counter()
+    manifest = {'builder': builder, 'assets': {}, 'pages': {}}
+    built = skipped = 0
+
+    def process(section, name, extra=''):
+        nonlocal built, skipped
+        with open(os.path.join(ROOT, name), 'rb') as f:
+            data = f.read()
+        key = hashlib.sha256(data + extra.encode('utf-8')).hexdigest()
+        entry = previous.get(section, {}).get(name)
+        if entry and entry['key'] == key and os.path.exists(os.path.join(out_dir, entry['output'])):
+            manifest[section][name] = entry
+            skipped += 1
+            return
+        # Fontes com CRLF (lista.html, js/auth.js): o build sai sempre com LF
+        text = data.decode('utf-8').replace('\r\n', '\n')
+        if section == 'assets':
+            result = build_asset(text, name).encode('utf-8')
+            output = hashed_name(name, result)
+        else:
+            result = build_page(text, name, {k: v['output'] for k, v in manifest['assets'].items()}).encode('utf-8')
+            output = name
+        write_atomic(os.path.join(out_dir, output), result)
+        manifest[section][name] = {
+            'key': key,
+            'output': output,
+            'source_sha256': hashlib.sha256(data).hexdigest(),
+            'size': len(data),
+            'built_size': len(result),
+        }
+        built += 1
+        print(f'  {name} -> {output} ({len(data)} -> {len(result)} bytes)')
+
+    for name in ASSETS:
+        process('assets', name)
+    # Pagina depende dos nomes dos assets que referencia: mudou um hash, a pagina e refeita
+    for name in PAGES:
+        with open(os.path.join(ROOT, name), encoding='utf-8') as f:
+            refs = referenced_assets(f.read(), name)
+        deps = {k: v['output'] for k, v in manifest['assets'].items() if k in refs}
+        process('pages', name, json.dumps(deps, sort_keys=True))
+
+    # Manifest por ultimo: o servidor nunca ve um nome que ainda nao existe em disco
+    write_atomic(manifest_path, json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+
+    # Assets da geracao anterior ficam (paginas ja abertas ainda podem pedi-los); os mais velhos saem
+    keep = {v['output'] for section in ('assets', 'pages') for v in manifest[section].values()}
+    keep |= {v['output'] for v in old.get('assets', {}).values()}
+    assets_dir = os.path.join(out_dir, ASSETS_DIR)
+    removed = 0
+    for entry in os.listdir(assets_dir) if os.path.isdir(assets_dir) else ():
+        if posixpath.join(ASSETS_DIR, entry) not in keep:
+            os.remove(os.path.join(assets_dir, entry))
+            removed += 1
+
+    print(f'{built} arquivo(s) gerado(s), {skipped} sem alteracao, {removed} antigo(s) removido(s) '
+          f'em {args.out}/ ({(time.perf_counter() - start) * 1000:.0f} ms)')
+
+
+if __name__ == '__main__':
+    main()
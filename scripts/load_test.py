@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Teste de carga do modo de concorrencia do basic_server.py
+
+Sobe o servidor em uma porta livre para cada quantidade de workers e dispara
+clientes concorrentes contra um endpoint que bloqueia por `--upstream-delay`
+segundos, simulando uma consulta lenta ao ViaCEP. No modo single cada
+requisicao lenta trava todas as outras; no modo threaded a vazao cresce com o
+numero de workers.
+
+Uso:
+    python scripts/load_test.py --workers 1 2 4 8 16 --clients 32 --requests 8
+"""
+
+import argparse
+import http.client
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import basic_server  # noqa: E402
+
+
+class SlowUpstreamHandler(basic_server.ProjectHandler):
+    """ProjectHandler cujo /api/quotes espera como uma chamada externa lenta"""
+    upstream_delay = 0.05
+
+    def handle_get_quotes(self):
+        time.sleep(self.upstream_delay)
+        super().handle_get_quotes()
+
+    def log_message(self, format, *args):
+        # Log de acesso no stderr distorce a medicao
+        pass
+
+
+def run_round(mode, workers, clients, requests_per_client):
+    """Roda uma rodada e retorna (requisicoes ok, erros, segundos)"""
+    server = basic_server.create_server(('127.0.0.1', 0), mode, workers,
+                                        queue_size=clients * 2, handler_class=SlowUpstreamHandler)
+    port = server.server_address[1]
+    server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+    server_thread.start()
+
+    ok = 0
+    errors = 0
+    lock = threading.Lock()
+
+    def client():
+        nonlocal ok, errors
+        for _ in range(requests_per_client):
+            try:
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+                conn.request('GET', '/api/quotes')
+                status = conn.getresponse().status
+                conn.close()
+            except OSError:
+                status = 0
+            with lock:
+                if status == 200:
+                    ok += 1
+                else:
+                    errors += 1
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    server.shutdown()
+    server.server_close()
+    return ok, errors, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Teste de carga do basic_server.py')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    parser.add_argument('--clients', type=int, default=32, help='clientes concorrentes')
+    parser.add_argument('--requests', type=int, default=8, help='requisicoes por cliente')
+    parser.add_argument('--upstream-delay', type=float, default=0.05,
+                        help='segundos que cada requisicao fica bloqueada no servidor')
+    parser.add_argument('--skip-single', action='store_true', help='nao medir o modo single')
+    args = parser.parse_args()
+
+    SlowUpstreamHandler.upstream_delay = args.upstream_delay
+
+    rounds = [] if args.skip_single else [('single', 1)]
+    rounds += [('threaded', workers) for workers in args.workers]
+
+    print(f"{args.clients} clientes x {args.requests} requisicoes, "
+          f"{args.upstream_delay * 1000:.0f} ms de espera por requisicao")
+    print(f"{'modo':<10}{'workers':>8}{'ok':>8}{'erros':>8}{'tempo (s)':>12}{'req/s':>10}")
+    for mode, workers in rounds:
+        ok, errors, elapsed = run_round(mode, workers, args.clients, args.requests)
+        print(f"{mode:<10}{workers:>8}{ok:>8}{errors:>8}{elapsed:>12.2f}{ok / elapsed:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Reparticiona os projetos do basic_server.py em `--shards` arquivos
+
+Le os projetos de onde estiverem hoje (banco principal e/ou shards de outro
+particionamento) e copia cada usuario para o shard `user_id % N`, mantendo
+ids, ordem, datas e a versao da lista; o indice FTS e as estatisticas sao
+refeitos pelos triggers do shard. Os shards novos sao gravados com sufixo
+`.tmp`, conferidos e renomeados; so depois os dados antigos sao apagados.
+`--shards 0` junta tudo de volta no banco principal.
+
+Rode com o servidor parado:
+    python scripts/reshard.py --shards 4
+    python basic_server.py --shards 4
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import basic_server  # noqa: E402
+
+# Tabelas copiadas por usuario; projects_fts e project_stats* vem dos triggers
+USER_TABLES = ('projects', 'project_versions')
+DERIVED_TABLES = ('project_stats', 'project_stats_monthly')
+
+
+def count_projects(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute('SELECT COUNT(*) FROM projects').fetchone()[0]
+    finally:
+        conn.close()
+
+
+def remove_database(path):
+    """Apaga o arquivo e os auxiliares do WAL"""
+    for suffix in ('', '-wal', '-shm', '-journal'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+def check_id_ranges(paths):
+    """Confere que as faixas de ids livres dos shards nao se sobrepoem
+    
+    A faixa do shard vai de `seq + 1` a `seq + SHARD_ID_SPAN`; nenhuma pode
+    cruzar outra nem conter um projeto ja existente em algum shard.
+    """
+    ranges = []
+    for path in paths:
+        conn = sqlite3.connect(path)
+        try:
+            seq = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'projects'").fetchone()[0]
+        finally:
+            conn.close()
+        ranges.append((seq + 1, seq + basic_server.SHARD_ID_SPAN, path))
+    ranges.sort()
+    for (_, high, path), (low, _, other) in zip(ranges, ranges[1:]):
+        if low <= high:
+            return f'faixas de ids de {path} e {other} se sobrepoem'
+    for path in paths:
+        conn = sqlite3.connect(path)
+        try:
+            for low, high, owner in ranges:
+                if conn.execute('SELECT 1 FROM projects WHERE id BETWEEN ? AND ? LIMIT 1', (low, high)).fetchone():
+                    return f'{path} tem projetos na faixa de ids livre de {owner}'
+        finally:
+            conn.close()
+    return None
+
+
+def copy_users(conn, sources, count, index):
+    """Copia para `conn` os usuarios de `sources` que caem no shard `index`
+    
+    As linhas passam pelo Python em vez de ATTACH: assim a copia inteira cabe
+    em uma transacao, qualquer que seja o numero de arquivos de origem.
+    """
+    for table in USER_TABLES:
+        columns = ', '.join(row[1] for row in conn.execute(f'PRAGMA table_info({table})'))
+        placeholders = ', '.join('?' * len(columns.split(', ')))
+        where = f'WHERE user_id % {count} = {index}' if count else ''
+        for source in sources:
+            src = sqlite3.connect(source)
+            try:
+                # INSERT simples: um id repetido (dados ja copiados antes) aborta em vez de duplicar
+                conn.executemany(f'INSERT INTO {table} ({columns}) VALUES ({placeholders})',
+                                 src.execute(f'SELECT {columns} FROM {table} {where}'))
+            finally:
+                src.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Reparticiona os projetos do basic_server.py')
+    parser.add_argument('--shards', type=int, required=True, help='numero de shards (0 = banco principal)')
+    parser.add_argument('--db', default=basic_server.DB_NAME, help='banco principal (usuarios)')
+    parser.add_argument('--shard-dir', default=basic_server.SHARD_DIR)
+    parser.add_argument('--vacuum', action='store_true', help='compacta o banco principal depois de esvazia-lo')
+    args = parser.parse_args()
+    if args.shards < 0:
+        parser.error('--shards deve ser >= 0')
+
+    # Todos os arquivos no schema atual antes de copiar coluna a coluna
+    basic_server.init_db(args.db)
+    old_shards = basic_server.shard_files(args.shard_dir)
+    for path in old_shards:
+        basic_server.init_db(path)
+
+    main_projects = count_projects(args.db)
+    targets = [basic_server.shard_path(i, args.shards, args.shard_dir) for i in range(args.shards)]
+    sources = old_shards + ([args.db] if args.shards else [])
+    total = sum(count_projects(path) for path in old_shards) + main_projects
+    if sorted(old_shards) == sorted(targets) and (not args.shards or not main_projects):
+        print(f'Nada a fazer: os projetos ja estao em {args.shards} shard(s)' if args.shards else 'Nada a fazer: nao ha shards')
+        return
+
+    start = time.perf_counter()
+    if args.shards:
+        os.makedirs(args.shard_dir, exist_ok=True)
+        # Faixas novas acima de todo id existente: os ids copiados ficam abaixo delas
+        base = basic_server.shard_id_base(max(basic_server.max_project_id(path) for path in sources))
+        for index, target in enumerate(targets):
+            temp = target + '.tmp'
+            remove_database(temp)
+            basic_server.init_shard(temp, index, base)
+            conn = sqlite3.connect(temp, isolation_level=None)
+            try:
+                conn.execute('BEGIN')
+                copy_users(conn, sources, args.shards, index)
+                conn.execute('COMMIT')
+                copied = conn.execute('SELECT COUNT(*) FROM projects').fetchone()[0]
+            except sqlite3.IntegrityError as e:
+                sys.exit(f'Id repetido ao copiar para {target} ({e}): ha projetos em dois lugares, '
+                         'provavelmente de um reshard interrompido. Nada foi alterado.')
+            finally:
+                conn.close()
+            print(f'  {target}: {copied} projeto(s)')
+
+        copied = sum(count_projects(target + '.tmp') for target in targets)
+        if copied != total:
+            sys.exit(f'Copiados {copied} de {total} projetos; shards novos mantidos em *.tmp, nada foi alterado')
+        overlap = check_id_ranges([target + '.tmp' for target in targets])
+        if overlap:
+            sys.exit(f'Ids dos shards novos se repetiriam ({overlap}); shards novos mantidos em *.tmp, nada foi alterado')
+
+        for target in targets:
+            # WAL antigo com o mesmo nome seria aplicado sobre o arquivo novo
+            remove_database(target)
+            os.replace(target + '.tmp', target)
+    else:
+        # De volta para o banco principal: uma transacao so
+        conn = sqlite3.connect(args.db, isolation_level=None)
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            copy_users(conn, old_shards, 0, 0)
+            copied = conn.execute('SELECT COUNT(*) FROM projects').fetchone()[0]
+            if copied != total:
+                sys.exit(f'Copiados {copied} de {total} projetos; nada foi alterado')
+            conn.execute('COMMIT')
+        except sqlite3.IntegrityError as e:
+            sys.exit(f'Id repetido ao copiar para {args.db} ({e}); nada foi alterado')
+        finally:
+            conn.close()
+        print(f'  {args.db}: {copied} projeto(s)')
+
+    # Dados antigos so saem depois que os novos estao no lugar
+    for path in old_shards:
+        if path not in targets:
+            remove_database(path)
+    if args.shards and main_projects:
+        conn = sqlite3.connect(args.db, isolation_level=None)
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            for table in USER_TABLES + DERIVED_TABLES:
+                conn.execute(f'DELETE FROM {table}')
+            conn.execute('COMMIT')
+            if args.vacuum:
+                conn.execute('VACUUM')
+        finally:
+            conn.close()
+
+    where = f"{args.shards} shard(s)" if args.shards else args.db
+    print(f"{total} projeto(s) em {where} ({time.perf_counter() - start:.1f} s)")
+    if args.shards:
+        print(f'Inicie o servidor com --shards {args.shards} (ou SHARD_COUNT={args.shards})')
+    else:
+        print('Inicie o servidor sem --shards')
+
+
+if __name__ == '__main__':
+    main()